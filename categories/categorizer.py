@@ -1,91 +1,124 @@
 import logging
+import threading
 
 from Levenshtein import distance as levenshtein_distance
-import re
 
+from categories.keyword_rules import KeywordRuleEngine
 from database.sqlite_client import SqliteClient
+from utility.memo_helper import clean_memo, normalize_memo
 
 
 class Categorizer:
 
+    # Match-string index and compiled keyword rules, shared by every Categorizer in the
+    # process.  Keyed by (database name, tblDataVersion counter name); each entry
+    # remembers the counter value it was built at and is rebuilt only once it moves.
+    _shared_indexes = {}
+    _shared_indexes_lock = threading.Lock()
+
     def __init__(self, sqlite_client: SqliteClient):
         self.sqlite_client = sqlite_client
         self.memos_to_categories_dict = {}
+        self.keyword_rules = None
         self.categories_list = []
 
     def clean_string(self, memo):
-        # Get rid of any characters that aren't alphanumeric or spaces
-        memo = re.sub("[^a-zA-Z\d\s:]", " ", memo)
-        # One more cleanup to get rid of multiple spaces in a row
-        memo = re.sub("\s+", " ", memo)
+        return clean_memo(memo)
+
+    def guess_best_category(self, memo, amount=None, source_bank=None):
+        return self.guess_best_categories([memo], [amount], [source_bank])[0]
 
-        # Lowercase to keep everything consistent
-        return memo.lower()
+    def guess_best_categories(self, memos, amounts=None, source_banks=None):
+        """Guess a category for each memo; returns one guess (or None) per memo, in order.
 
-    def guess_best_category(self, memo):
-        memo = self.clean_string(memo)
+        amounts and source_banks, when given, line up with memos.  Each distinct memo
+        is cleaned, looked up and run through the keyword automatons only once.
+        """
+        if amounts is None:
+            amounts = [None] * len(memos)
+        if source_banks is None:
+            source_banks = [None] * len(memos)
 
         if not self.memos_to_categories_dict:
             self.refresh_memos_to_cateogries_dict()
 
-        if memo in self.memos_to_categories_dict:
-            return self.memos_to_categories_dict[memo]
-
-        # Else, might need to do some keyword searching to make a best guess at the category
-        # throwing this in code for now.  It could definitely be in the DB if it were able to be
-        # customized, though.
-        mappings_in_code = {
-            "amzn mktp": "amazon",
-            "amazon com": "amazon",
-            "amz descriptor": "amazon",
-            "amzn": "amazon",
-            "amazon prime": "amazon",
-            "exxonmobil": "gasoline",
-            "nintendo": "entertainment",
-            "wf wayfair": "home improvement",
-            "target": "target",
-            "kindle svcs": "entertainment",
-            "starbucks store": "coffee out",
-            "starbucks": "coffee out",
-            "hannaford": "groceries",
-            "wholefoods": "groceries",
-            "whole foods market": "groceries",
-            "wayfair": "home improvement",
-            "cvs pharmacy": "healthcare",
-            "andover water": "water bill",
-            " alma ": "healthcare",
-            "chewy com": "pet expenses",
-            "bbss ": "kid recreation",
-            "mahoneys": "home improvement",
-            "the home depot": "home improvement",
-            "supercuts": "haircut",
-            "vzwrlss": "cell phone plan",
-            "parking": "parking",
-            "eversource": "natural gas",
-            "ngrid05": "electricity bill",
-            "venmo": "venmo",
-            "check": "check",
-        }
-
-        for key in mappings_in_code:
-            if key in memo:
-                logging.debug(
-                    "Using mapped keyword to find category: " + mappings_in_code[key]
-                )
-                return {"category_id": None, "category_name": mappings_in_code[key]}
+        if self.keyword_rules is None:
+            self.refresh_keyword_rules()
+
+        prepared = {}
+        guesses = []
+        for memo, amount, source_bank in zip(memos, amounts, source_banks):
+            if memo not in prepared:
+                cleaned = self.clean_string(memo)
+                # Keyed like TxMemoNormalized/MatchStringNormalized, so both sides agree
+                exact = self.memos_to_categories_dict.get(cleaned.strip())
+                if exact is not None:
+                    prepared[memo] = (exact, None)
+                else:
+                    # Else, fall back to the keyword rules to make a best guess at the category
+                    prepared[memo] = (None, self.keyword_rules.prepare(memo, cleaned))
+
+            exact, prepared_memo = prepared[memo]
+            if exact is not None:
+                guesses.append(exact)
+                continue
+
+            rule = self.keyword_rules.match_prepared(prepared_memo, amount, source_bank)
+            if rule is None:
+                guesses.append(None)
+                continue
+
+            logging.debug(
+                "Using keyword rule %s to find category: %s"
+                % (rule["rule_id"], rule["category_name"])
+            )
+            guesses.append(
+                {
+                    "category_id": rule["category_id"],
+                    "category_name": rule["category_name"],
+                    "keyword_rule_id": rule["rule_id"],
+                    "auto_apply": rule["auto_apply"],
+                }
+            )
 
-        return None
+        return guesses
 
     def refresh_memos_to_cateogries_dict(self):
+        self.memos_to_categories_dict = self._get_shared_index(
+            SqliteClient.MATCH_STRINGS_VERSION, self._build_memos_to_categories_dict
+        )
+
+    def refresh_keyword_rules(self):
+        self.keyword_rules = self._get_shared_index(
+            SqliteClient.KEYWORD_RULES_VERSION,
+            lambda: KeywordRuleEngine(self.sqlite_client.get_category_keyword_rules()),
+        )
+
+    def _get_shared_index(self, version_name, build):
+        key = (self.sqlite_client.database_name, version_name)
+        version = self.sqlite_client.get_data_version(version_name)
+
+        shared = Categorizer._shared_indexes.get(key)
+        if shared is None or shared[0] != version:
+            with Categorizer._shared_indexes_lock:
+                shared = Categorizer._shared_indexes.get(key)
+                if shared is None or shared[0] != version:
+                    shared = (version, build())
+                    Categorizer._shared_indexes[key] = shared
+
+        return shared[1]
+
+    def _build_memos_to_categories_dict(self):
         data = self.sqlite_client.get_memos_to_categories()
 
-        self.memos_to_categories_dict = {}
+        memos_to_categories_dict = {}
         for datum in data:
-            cleaned_key = self.clean_string(datum[2])
-            self.memos_to_categories_dict[cleaned_key] = {
+            memos_to_categories_dict[normalize_memo(datum[2])] = {
                 "category_id": datum[0],
                 "category_name": datum[1],
+                "match_id": datum[3],
             }
+        return memos_to_categories_dict
 
     def get_very_similar_category(self, input_category):
         if not self.categories_list:
@@ -117,7 +150,7 @@ class Categorizer:
         self.refresh_categories_list()
 
     def make_note_of_memo_and_category(self, memo, category_id):
-        if memo not in self.memos_to_categories_dict:
+        if normalize_memo(memo) not in self.memos_to_categories_dict:
             self.sqlite_client.insert_memo_to_category(memo, category_id)
             self.refresh_memos_to_cateogries_dict()
 
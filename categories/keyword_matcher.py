@@ -0,0 +1,90 @@
+from collections import deque
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed, ordered list of (keyword, value) pairs.
+
+    match_all() finds every keyword occurring anywhere in the text, and
+    match_prefixes() every keyword the text starts with, each in a single pass
+    over the text; values come back in keyword list order.
+    """
+
+    def __init__(self, keywords):
+        self._values = []
+        # Per automaton state: outgoing edges, failure link, priorities of the keywords
+        # ending exactly here, and of every keyword ending here or anywhere on the
+        # failure chain
+        self._goto = [{}]
+        self._fail = [0]
+        self._ends = [()]
+        self._outputs = [()]
+
+        for keyword, value in keywords:
+            priority = len(self._values)
+            self._values.append(value)
+            self._add(keyword, priority)
+
+        self._link()
+
+    def __len__(self):
+        return len(self._values)
+
+    def match_all(self, text):
+        """Return the values of every keyword found in text, in list order."""
+        delta = self._delta
+        outputs = self._outputs
+
+        state = 0
+        found = set(outputs[0])
+        for char in text:
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                found.update(outputs[state])
+
+        return [self._values[p] for p in sorted(found)]
+
+    def match_prefixes(self, text):
+        """Return the values of every keyword text starts with, in list order."""
+        goto = self._goto
+        ends = self._ends
+
+        state = 0
+        found = list(ends[0])
+        for char in text:
+            state = goto[state].get(char)
+            if state is None:
+                break
+            found.extend(ends[state])
+
+        return [self._values[p] for p in sorted(found)]
+
+    def _add(self, keyword, priority):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._ends.append(())
+                self._outputs.append(())
+                self._goto[state][char] = next_state
+            state = next_state
+
+        self._ends[state] += (priority,)
+        self._outputs[state] = self._ends[state]
+
+    def _link(self):
+        # Breadth-first so every state's failure target is finished before its children.
+        # Failure links are folded into a full transition table (delta) so matching
+        # takes exactly one dict lookup per character.
+        self._delta = [dict(self._goto[0])] + [None] * (len(self._goto) - 1)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            fallback = self._fail[state]
+            self._delta[state] = dict(self._delta[fallback], **self._goto[state])
+            for char, child in self._goto[state].items():
+                self._fail[child] = self._delta[fallback].get(char, 0)
+                self._outputs[child] = self._ends[child] + self._outputs[self._fail[child]]
+                queue.append(child)
@@ -0,0 +1,113 @@
+import logging
+import re
+
+from categories.keyword_matcher import KeywordMatcher
+from utility.memo_helper import clean_memo
+
+
+class KeywordRuleEngine:
+    """tblCategoryKeywordRule compiled into a single matcher.
+
+    Substring and prefix patterns are matched against the cleaned memo by
+    Aho-Corasick automatons, so a memo is scanned once however many rules there
+    are.  Regex patterns run against the raw memo (case-insensitive) and are only
+    tried while they still outrank the best keyword hit.  Of the rules whose
+    pattern and conditions (amount range, source bank) all hold, the one that
+    comes first in evaluation order wins.
+    """
+
+    def __init__(self, rules):
+        # rules: dicts as returned by SqliteClient.get_category_keyword_rules(), in evaluation order
+        self.rules = list(rules)
+        self._regexes = []
+
+        substrings = []
+        prefixes = []
+        for index, rule in enumerate(self.rules):
+            if rule["match_type"] == "regex":
+                try:
+                    self._regexes.append(
+                        (index, re.compile(rule["pattern"], re.IGNORECASE))
+                    )
+                except re.error as e:
+                    logging.warning(
+                        "Skipping keyword rule %s, bad regex %r: %s"
+                        % (rule["rule_id"], rule["pattern"], e)
+                    )
+                continue
+
+            keyword = clean_memo(rule["pattern"])
+            if not keyword.strip():
+                # An empty keyword would match every memo
+                logging.warning(
+                    "Skipping keyword rule %s, pattern %r has nothing to match on"
+                    % (rule["rule_id"], rule["pattern"])
+                )
+            elif rule["match_type"] == "prefix":
+                prefixes.append((keyword.lstrip(), index))
+            else:
+                substrings.append((keyword, index))
+
+        self._substrings = KeywordMatcher(substrings)
+        self._prefixes = KeywordMatcher(prefixes)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def prepare(self, memo, cleaned=None):
+        """Do the pattern work that depends only on the memo.
+
+        The result can be passed to match_prepared() for every row sharing this memo.
+        cleaned is clean_memo(memo), if the caller already has it.
+        """
+        if cleaned is None:
+            cleaned = clean_memo(memo)
+        hits = set(self._substrings.match_all(cleaned))
+        hits.update(self._prefixes.match_prefixes(cleaned.lstrip()))
+
+        # Regex results are filled in lazily, only for the regexes a row gets to
+        return (memo, sorted(hits), {})
+
+    def match_prepared(self, prepared, amount=None, source_bank=None):
+        """Return the winning rule for a memo from prepare(), or None.
+
+        Rules with an amount range never match when amount is None, and rules tied
+        to a source bank only match when source_bank is that bank's name.
+        """
+        memo, hits, regex_results = prepared
+
+        best = None
+        for index in hits:
+            if self._conditions_hold(self.rules[index], amount, source_bank):
+                best = index
+                break
+
+        for index, regex in self._regexes:
+            if best is not None and index > best:
+                break
+
+            if index not in regex_results:
+                regex_results[index] = regex.search(memo) is not None
+            if regex_results[index] and self._conditions_hold(
+                self.rules[index], amount, source_bank
+            ):
+                best = index
+                break
+
+        if best is None:
+            return None
+        return self.rules[best]
+
+    def _conditions_hold(self, rule, amount, source_bank):
+        if rule["amount_min"] is not None:
+            if amount is None or amount < rule["amount_min"]:
+                return False
+
+        if rule["amount_max"] is not None:
+            if amount is None or amount > rule["amount_max"]:
+                return False
+
+        if rule["source_bank_name"] and source_bank != rule["source_bank_name"]:
+            return False
+
+        return True
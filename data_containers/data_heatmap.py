@@ -1,10 +1,10 @@
 import logging
 
-from data_containers.color import Color
+import numpy as np
+
 from utility.money_helper import format_money
 from utility.time_helper import (
-    get_timestamp_month_integer,
-    get_timestamp_year_integer,
+    get_timestamp_for_datekey,
     get_date_keys_for_timestamp_range,
 )
 
@@ -21,180 +21,186 @@ _SATURATION = 0.9
 _HUE_SURPLUS = 0.45
 _LIGHTNESS_SURPLUS = 0.38
 
+_NEUTRAL_RGB = "#FFFFFF"
+_HEX_BYTES = np.array(["%02x" % i for i in range(256)])
 
-class DataHeatmap:
+# Same constants colorsys uses, so the vectorized conversion matches it exactly
+_ONE_SIXTH = 1.0 / 6.0
+_ONE_THIRD = 1.0 / 3.0
+_TWO_THIRD = 2.0 / 3.0
 
-    def __init__(self):
-        self.the_matrix = {}
-        self.by_category = {}
 
-    def get_dates(self):
-        return self.the_matrix.keys()
+def _hls_channel(m1, m2, hue):
+    # Vectorized colorsys._v
+    hue = np.mod(hue, 1.0)
+    return np.select(
+        [hue < _ONE_SIXTH, hue < 0.5, hue < _TWO_THIRD],
+        [m1 + (m2 - m1) * hue * 6.0, m2, m1 + (m2 - m1) * (_TWO_THIRD - hue) * 6.0],
+        default=m1,
+    )
 
-    def get_value(self, date_key, category):
-        return self.the_matrix.get(date_key)[category]
 
-    def get_row_total(self, category):
-        """Sum of all values for this category across all dates (net; negative = net expense)."""
-        total = 0
-        for date_key in self.the_matrix:
-            total += self.the_matrix[date_key].get(category, 0)
-        return total
+def _hls_to_rgb_strings(hue, lightness, saturation):
+    """Vectorized colorsys.hls_to_rgb plus '#rrggbb' formatting for arrays of cells."""
+    m2 = np.where(
+        lightness <= 0.5,
+        lightness * (1.0 + saturation),
+        lightness + saturation - (lightness * saturation),
+    )
+    m1 = 2.0 * lightness - m2
 
-    def get_rgb(self, date_key, cat):
-        return self.by_category[cat][date_key].get_rgb_string()
-
-    def get_total_for_date(self, date_key, only_positive=False, only_negative=False):
-        if only_negative and only_positive:
-            raise Exception("You cant have both positive only and negative only")
+    channels = [
+        (255 * _hls_channel(m1, m2, hue + _ONE_THIRD)).astype(int),
+        (255 * _hls_channel(m1, m2, hue)).astype(int),
+        (255 * _hls_channel(m1, m2, hue - _ONE_THIRD)).astype(int),
+    ]
 
-        category_data = self.the_matrix.get(date_key)
+    rgb = np.full(hue.shape, "#", dtype="<U7")
+    for channel in channels:
+        rgb = np.char.add(rgb, _HEX_BYTES[channel])
+    return rgb
 
-        total = 0
-        for category in category_data:
-            if only_positive and category_data[category] > 0:
-                total = total + category_data[category]
-            elif only_negative and category_data[category] < 0:
-                total = total + category_data[category]
-            elif not only_negative and not only_positive:
-                total = total + category_data[category]
 
-        return format_money(total)
+class DataHeatmap:
+    """Month x category spend matrix backed by dense numpy arrays.
 
-    def init_from_raw(self, data, categories):
-        # Find min timestamp
-        ts_min = None
-        for datapoint in data:
-            if ts_min is None or ts_min > datapoint["Timestamp"]:
-                ts_min = datapoint["Timestamp"]
+    values[i, j] is the net amount for dates[i] and categories[j], filled[i, j] marks
+    cells that had any transactions, and colors holds the matching '#rrggbb' cell
+    color, computed for all cells at once.
+    """
 
-        # Find max timestamp
-        ts_max = None
-        for datapoint in data:
-            if ts_max is None or ts_max < datapoint["Timestamp"]:
-                ts_max = datapoint["Timestamp"]
+    def __init__(self):
+        self.dates = []
+        self.categories = []
+        self._date_index = {}
+        self._category_index = {}
+        self.values = np.zeros((0, 0))
+        self.filled = np.zeros((0, 0), dtype=bool)
+        self.colors = np.full((0, 0), _NEUTRAL_RGB, dtype="<U7")
 
-        if not ts_min and not ts_max:
-            return
+    def get_dates(self):
+        return self.dates
 
-        month_range = get_date_keys_for_timestamp_range(ts_min, ts_max)
+    def get_categories(self):
+        return self.categories
 
-        all_categories_dict = {}
-        for category in categories:
-            all_categories_dict[category[1]] = 0
+    def get_value(self, date_key, category):
+        return float(self.values[self._date_index[date_key], self._category_index[category]])
 
-        for year_and_month_key in month_range:
-            # year_and_month_key = month.strftime('%Y-%m')
-            if year_and_month_key not in self.the_matrix:
-                self.the_matrix[year_and_month_key] = all_categories_dict.copy()
+    def get_values_for_category(self, category, date_keys):
+        """Values for one category over date_keys, with 0 for months outside the matrix."""
+        if category not in self._category_index:
+            return [0 for _ in date_keys]
 
-        # {'CategoryName': 'amazon', 'MoneySpent': -9.99, 'Timestamp'
-        for datapoint in data:
-            category = datapoint["CategoryName"]
-            money_spent = datapoint["MoneySpent"]
-            timestamp = datapoint["Timestamp"]
+        column = self.values[:, self._category_index[category]]
+        return [
+            float(column[self._date_index[d]]) if d in self._date_index else 0
+            for d in date_keys
+        ]
 
-            if category not in [a[1] for a in categories]:
-                continue
+    def get_row_total(self, category):
+        """Sum of all values for this category across all dates (net; negative = net expense)."""
+        j = self._category_index.get(category)
+        if j is None or not self.filled[:, j].any():
+            return 0
 
-            month_integer = get_timestamp_month_integer(timestamp)
-            year_integer = get_timestamp_year_integer(timestamp)
+        # cumsum adds in date order, the same as a running total would
+        return float(np.cumsum(self.values[:, j])[-1])
 
-            # Why am I doing this here and not the database?  Sqlite can't do it.  No dates.
+    def get_rgb(self, date_key, cat):
+        return str(self.colors[self._date_index[date_key], self._category_index[cat]])
 
-            date_key = str(year_integer) + "-" + str(month_integer)
+    def get_total_for_date(self, date_key, only_positive=False, only_negative=False):
+        if only_negative and only_positive:
+            raise Exception("You cant have both positive only and negative only")
 
-            self.the_matrix[date_key][category] += money_spent
+        row = self.values[self._date_index[date_key]]
+        if only_positive:
+            row = np.where(row > 0, row, 0.0)
+        elif only_negative:
+            row = np.where(row < 0, row, 0.0)
 
-        # Clean up the massive decimal places
-        for date in self.the_matrix:
-            for category in self.the_matrix[date]:
-                self.the_matrix[date][category] = round(
-                    self.the_matrix.get(date)[category], 2
-                )
-                if category not in self.by_category:
-                    self.by_category[category] = {}
+        total = float(np.cumsum(row)[-1]) if len(row) else 0
+        return format_money(total)
 
-                self.by_category[category][date] = Color(Color.WHITE)
+    def init_from_month_totals(self, month_totals, categories):
+        """Build from pre-aggregated (month_key, category_name, total) tuples.
 
-        num_dates = len(self.the_matrix)
-        use_column_scale = num_dates <= 1
+        Months between the first and last month present are filled in with zeros,
+        as are categories with no spend in a month.
+        """
+        if not month_totals:
+            return
 
-        if use_column_scale:
+        month_keys = [t[0] for t in month_totals]
+        self.dates = get_date_keys_for_timestamp_range(
+            get_timestamp_for_datekey(min(month_keys)),
+            get_timestamp_for_datekey(max(month_keys)),
+        )
+        self.categories = list(dict.fromkeys(a[1] for a in categories))
+        self._date_index = {d: i for i, d in enumerate(self.dates)}
+        self._category_index = {c: j for j, c in enumerate(self.categories)}
+
+        cells = {}
+        for date_key, category, total in month_totals:
+            if category in self._category_index:
+                cell = (self._date_index[date_key], self._category_index[category])
+                cells[cell] = cells.get(cell, 0) + total
+
+        self.values = np.zeros((len(self.dates), len(self.categories)))
+        self.filled = np.zeros(self.values.shape, dtype=bool)
+        for cell, total in cells.items():
+            # Clean up the massive decimal places
+            self.values[cell] = round(total, 2)
+            self.filled[cell] = True
+
+        self._apply_colors()
+
+    def _apply_colors(self):
+        values = self.values
+        negative = values < 0
+        negatives_or_low = np.where(negative, values, -np.inf)
+        negatives_or_high = np.where(negative, values, np.inf)
+
+        if len(self.dates) <= 1:
             # Single month (or no dates): color by position within the column
-            for date in self.the_matrix:
-                col_data = self.the_matrix[date]
-                least = None
-                most = None
-                for cat in col_data:
-                    v = col_data[cat]
-                    if v < 0:
-                        if least is None or v > least:
-                            least = v
-                        if most is None or v < most:
-                            most = v
-
-                for category in self.by_category:
-                    money_value = self.the_matrix[date].get(category, 0)
-                    if money_value < 0 and least is not None and most is not None and most < least:
-                        ratio = (money_value - least) / (most - least)
-                        hue = _HUE_LOW + ratio * (_HUE_HIGH - _HUE_LOW)
-                        lightness = _LIGHTNESS_LOW + ratio * (_LIGHTNESS_HIGH - _LIGHTNESS_LOW)
-                        color = Color(Color.RED)
-                        color.hue = hue
-                        color.saturation = _SATURATION
-                        color.set_lightness(lightness)
-                        self.by_category[category][date] = color
-                    elif money_value < 0:
-                        color = Color(Color.RED)
-                        color.hue = _HUE_LOW
-                        color.saturation = _SATURATION
-                        color.set_lightness((_LIGHTNESS_LOW + _LIGHTNESS_HIGH) / 2)
-                        self.by_category[category][date] = color
-                    elif money_value > 0:
-                        color = Color(Color.GREEN)
-                        color.hue = _HUE_SURPLUS
-                        color.saturation = _SATURATION
-                        color.set_lightness(_LIGHTNESS_SURPLUS)
-                        self.by_category[category][date] = color
+            least = negatives_or_low.max(axis=1, keepdims=True, initial=-np.inf)
+            most = negatives_or_high.min(axis=1, keepdims=True, initial=np.inf)
         else:
-            # Multiple months: color by position within the row (category over time)
-            for category in self.by_category:
-                least_money_spent = None
-                most_money_spent = None
-
-                for date in self.by_category[category]:
-                    money_value = self.the_matrix[date][category]
-                    if least_money_spent is None or (
-                        money_value < 0 and money_value > least_money_spent
-                    ):
-                        least_money_spent = money_value
-
-                    if most_money_spent is None or (
-                        money_value < 0 and money_value < most_money_spent
-                    ):
-                        most_money_spent = money_value
-
-                for date in self.by_category[category]:
-                    money_value = self.the_matrix[date][category]
-                    if money_value < 0 and most_money_spent is not None and least_money_spent is not None and most_money_spent < least_money_spent:
-                        ratio = (money_value - least_money_spent) / (most_money_spent - least_money_spent)
-                        hue = _HUE_LOW + ratio * (_HUE_HIGH - _HUE_LOW)
-                        lightness = _LIGHTNESS_LOW + ratio * (_LIGHTNESS_HIGH - _LIGHTNESS_LOW)
-                        color = Color(Color.RED)
-                        color.hue = hue
-                        color.saturation = _SATURATION
-                        color.set_lightness(lightness)
-                        self.by_category[category][date] = color
-                    elif money_value < 0 and (most_money_spent == least_money_spent or most_money_spent is None or least_money_spent is None):
-                        color = Color(Color.RED)
-                        color.hue = _HUE_LOW
-                        color.saturation = _SATURATION
-                        color.set_lightness((_LIGHTNESS_LOW + _LIGHTNESS_HIGH) / 2)
-                        self.by_category[category][date] = color
-                    elif money_value > 0:
-                        color = Color(Color.GREEN)
-                        color.hue = _HUE_SURPLUS
-                        color.saturation = _SATURATION
-                        color.set_lightness(_LIGHTNESS_SURPLUS)
-                        self.by_category[category][date] = color
+            # Multiple months: color by position within the row (category over time).
+            # When the first month isn't a spend, it anchors the light end of the scale.
+            first = values[:1, :]
+            least = np.where(
+                first < 0, negatives_or_low.max(axis=0, keepdims=True), first
+            )
+            most = np.where(
+                negative.any(axis=0, keepdims=True),
+                negatives_or_high.min(axis=0, keepdims=True),
+                first,
+            )
+
+        graded = negative & (most < least)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(graded, (values - least) / (most - least), 0.0)
+
+        surplus = values > 0
+        hue = np.select(
+            [graded, negative, surplus],
+            [_HUE_LOW + ratio * (_HUE_HIGH - _HUE_LOW), _HUE_LOW, _HUE_SURPLUS],
+            default=0.0,
+        )
+        lightness = np.select(
+            [graded, negative, surplus],
+            [
+                _LIGHTNESS_LOW + ratio * (_LIGHTNESS_HIGH - _LIGHTNESS_LOW),
+                (_LIGHTNESS_LOW + _LIGHTNESS_HIGH) / 2,
+                _LIGHTNESS_SURPLUS,
+            ],
+            default=0.0,
+        )
+
+        self.colors = np.where(
+            negative | surplus,
+            _hls_to_rgb_strings(hue, lightness, _SATURATION),
+            _NEUTRAL_RGB,
+        )
@@ -1,3 +1,4 @@
+from categories.categorizer import Categorizer
 from database.sqlite_client import SqliteClient
 from parsers.parsers import Parser, CapitalOneParser, BarclaysParser, ChaseParser, AmericanExpressParser
 from utility.time_observer import TimeObserver
@@ -7,8 +8,10 @@ coloredlogs.install(level='DEBUG')
 
 class InputFile:
 
-    def __init__(self, db_client: SqliteClient):
+    def __init__(self, db_client: SqliteClient, apply_keyword_rules=True):
         self.db_client = db_client
+        # Also let keyword rules flagged AutoApply categorize new rows, not just exact match strings
+        self.apply_keyword_rules = apply_keyword_rules
 
     def get_parser(self, file_path) -> Parser:
         filename = file_path.split('/')[-1].lower()
@@ -45,6 +48,47 @@ class InputFile:
             return
 
         if file_path_id:
-            parser.parse(file_path, file_path_id)
+            self.db_client.run_serialized(self._parse_and_categorize, parser, file_path, file_path_id)
 
         return file_path_id
+
+    def _parse_and_categorize(self, parser, file_path, file_id):
+        # Parse and categorize commit together, so a file never lands half-categorized
+        with self.db_client.transaction():
+            parser.parse(file_path, file_id)
+            self.categorize_new_transactions(file_id)
+
+    def categorize_new_transactions(self, file_id):
+        """Categorize a file's uncategorized rows from the rules on file, in one batch.
+
+        Exact match strings always apply; keyword rules only when they are flagged
+        AutoApply (and apply_keyword_rules is on).  Returns the number categorized.
+        """
+        rows = self.db_client.get_uncategorized_transactions_for_file(file_id)
+        if not rows:
+            return 0
+
+        guesses = Categorizer(self.db_client).guess_best_categories(
+            [row[2] for row in rows],
+            amounts=[row[1] for row in rows],
+            source_banks=[row[3] for row in rows],
+        )
+
+        updates = []
+        by_match_string = 0
+        for (tx_id, _, _, _), guess in zip(rows, guesses):
+            if guess is None:
+                continue
+
+            if guess.get("match_id"):
+                updates.append((guess["category_id"], guess["match_id"], None, tx_id))
+                by_match_string += 1
+            elif self.apply_keyword_rules and guess.get("auto_apply"):
+                updates.append((guess["category_id"], None, guess["keyword_rule_id"], tx_id))
+
+        categorized = self.db_client.apply_rule_categories(updates)
+        logging.info(
+            'Auto-categorized %d of %d new transactions (%d by match string, %d by keyword rule)'
+            % (categorized, len(rows), by_match_string, len(updates) - by_match_string)
+        )
+        return categorized
@@ -0,0 +1,127 @@
+"""Take a compressed snapshot of the database and prune old ones.
+
+    python3 -m database.backup [path/to/tx.db] [backup dir] [snapshots to keep] [zstd|gzip|none]
+
+Writes moneypit-backup-<timestamp>.db(.zst|.gz) into the backup dir (default
+sqlite/backups), then deletes all but the newest snapshots there (default 14), so
+it can run straight from cron.  zstd needs the optional zstandard package; the
+default compression is zstd when it's installed and gzip otherwise.
+"""
+import os
+import sys
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from database.sqlite_client import SqliteClient
+
+SNAPSHOT_PREFIX = "moneypit-backup-"
+SNAPSHOT_EXTENSIONS = {"none": ".db", "gzip": ".db.gz", "zstd": ".db.zst"}
+STREAM_CHUNK_SIZE = 1024 * 1024
+DEFAULT_BACKUP_DIR = "sqlite/backups"
+DEFAULT_KEEP = 14
+
+
+def available_compressions():
+    return [c for c in SNAPSHOT_EXTENSIONS if c != "zstd" or zstandard is not None]
+
+
+def default_compression():
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def snapshot_filename(compression, now=None):
+    if now is None:
+        now = datetime.now()
+    return SNAPSHOT_PREFIX + now.strftime("%Y-%m-%d-%H%M%S") + SNAPSHOT_EXTENSIONS[compression]
+
+
+def stream_snapshot(snapshot, compression="none", chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a snapshot from SqliteClient.snapshot() in chunks, compressing as it goes."""
+    if compression not in available_compressions():
+        raise ValueError("Unsupported snapshot compression %r" % compression)
+
+    if compression == "gzip":
+        # wbits 31: a deflate stream wrapped in a gzip header and trailer
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    elif compression == "zstd":
+        compressor = zstandard.ZstdCompressor().compressobj()
+    else:
+        compressor = None
+
+    view = memoryview(snapshot)
+    for start in range(0, len(view), chunk_size):
+        chunk = view[start:start + chunk_size]
+        if compressor is None:
+            yield bytes(chunk)
+            continue
+
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def write_snapshot(db_client: SqliteClient, backup_dir, compression):
+    """Write a new snapshot into backup_dir and return its path.
+
+    The file only appears under its final name once it's complete and synced, so
+    a crash mid-write never leaves a truncated snapshot behind to be rotated in.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, snapshot_filename(compression))
+    partial_path = path + ".part"
+
+    with open(partial_path, "wb") as f:
+        for chunk in stream_snapshot(db_client.snapshot(), compression):
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial_path, path)
+    return path
+
+
+def rotate_snapshots(backup_dir, keep):
+    """Delete all but the newest keep snapshots in backup_dir; returns the removed paths."""
+    snapshots = sorted(
+        name
+        for name in os.listdir(backup_dir)
+        if name.startswith(SNAPSHOT_PREFIX)
+        and name.endswith(tuple(SNAPSHOT_EXTENSIONS.values()))
+    )
+
+    # Names embed the timestamp, so they sort oldest first
+    removed = []
+    for name in snapshots[:max(len(snapshots) - keep, 0)]:
+        path = os.path.join(backup_dir, name)
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+def main(argv):
+    database_name = argv[1] if len(argv) > 1 else "sqlite/tx.db"
+    backup_dir = argv[2] if len(argv) > 2 else DEFAULT_BACKUP_DIR
+    keep = int(argv[3]) if len(argv) > 3 else DEFAULT_KEEP
+    compression = argv[4] if len(argv) > 4 else default_compression()
+    if compression not in available_compressions() or keep < 1:
+        print(__doc__)
+        return 2
+
+    db_client = SqliteClient(database_name, migrate=False)
+    path = write_snapshot(db_client, backup_dir, compression)
+    print("Wrote %s (%d bytes)" % (path, os.path.getsize(path)))
+
+    for removed in rotate_snapshots(backup_dir, keep):
+        print("Removed %s" % removed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
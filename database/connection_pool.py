@@ -0,0 +1,231 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Hands out long-lived sqlite connections, at most one per thread at a time.
+
+    A thread that already holds a connection gets the same one back on nested
+    checkouts, so a request (or a method that calls other methods) runs all of
+    its statements on a single connection.  Idle connections are kept around
+    and handed to the next thread that needs one, so the file open and schema
+    parse happen once per connection instead of once per query.
+    """
+
+    def __init__(
+        self,
+        database_name,
+        size=5,
+        checkout_timeout=30,
+        health_check_interval=60,
+        before_commit=None,
+        pragmas=(),
+        cached_statements=128,
+    ):
+        self.database_name = database_name
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        # Called with the connection just before any commit that has writes to commit
+        self.before_commit = before_commit
+        # (name, value) PRAGMAs run on every new connection
+        self.pragmas = list(pragmas)
+        # Per-connection LRU of compiled statements (sqlite3's default is 128)
+        self.cached_statements = cached_statements
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all_connections = []
+
+    def checkout(self) -> sqlite3.Connection:
+        lease = getattr(self._local, "lease", None)
+        if lease is not None:
+            lease["depth"] += 1
+            return lease["connection"]
+
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolExhaustedError(
+                "No sqlite connection available after %ss (pool size %d)"
+                % (self.checkout_timeout, self.size)
+            )
+
+        try:
+            connection = self._get_healthy_connection()
+        except Exception:
+            self._slots.release()
+            raise
+
+        self._local.lease = self._new_lease(connection)
+        return connection
+
+    def checkout_dedicated(self) -> sqlite3.Connection:
+        """Give the calling thread a connection of its own for as long as it runs.
+
+        The connection doesn't count against size and is never returned to the
+        idle queue, so a long-lived thread (e.g. the write queue's writer) can't be
+        starved by, or starve, the threads sharing the pool.
+        """
+        connection = self._connect()
+        self._local.lease = self._new_lease(connection)
+        return connection
+
+    def release(self):
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            return
+
+        lease["depth"] -= 1
+        if lease["depth"] > 0:
+            return
+
+        self._local.lease = None
+        connection = lease["connection"]
+
+        # Never hand a half-finished transaction to the next thread
+        if connection.in_transaction:
+            connection.rollback()
+
+        self._idle.put((connection, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        """Group every statement run on this thread's connection into one commit.
+
+        Nested transaction() blocks join the outermost one; only the outermost
+        block commits (or rolls back if an exception escapes it).
+        """
+        connection = self.checkout()
+        lease = self._local.lease
+        lease["transactions"] += 1
+        try:
+            yield connection
+        except BaseException:
+            lease["transactions"] -= 1
+            if lease["transactions"] == 0:
+                connection.rollback()
+                lease["after_commit"] = []
+            raise
+        else:
+            lease["transactions"] -= 1
+            if lease["transactions"] == 0:
+                self.commit(connection)
+        finally:
+            self.release()
+
+    @contextmanager
+    def savepoint(self, connection, name):
+        """Undo just the statements run inside the block if an exception escapes it.
+
+        after_commit() callbacks registered inside the block are dropped with them.
+        Must run inside a transaction.
+        """
+        lease = self._local.lease
+        mark = len(lease["after_commit"])
+        connection.execute("SAVEPOINT %s" % name)
+        try:
+            yield
+        except BaseException:
+            connection.execute("ROLLBACK TO %s" % name)
+            connection.execute("RELEASE %s" % name)
+            del lease["after_commit"][mark:]
+            raise
+        else:
+            connection.execute("RELEASE %s" % name)
+
+    def after_commit(self, callback):
+        """Call callback() once this thread's current transaction has committed.
+
+        Callbacks are dropped, never called, if the transaction rolls back instead,
+        so in-memory caches of freshly written rows can't outlive the rows.
+        """
+        self._local.lease["after_commit"].append(callback)
+
+    def commit(self, connection):
+        if self.before_commit is not None and connection.in_transaction:
+            self.before_commit(connection)
+        connection.commit()
+
+        lease = getattr(self._local, "lease", None)
+        if lease is not None and lease["connection"] is connection:
+            callbacks, lease["after_commit"] = lease["after_commit"], []
+            for callback in callbacks:
+                callback()
+
+    def in_transaction(self):
+        lease = getattr(self._local, "lease", None)
+        return lease is not None and lease["transactions"] > 0
+
+    def close_all(self):
+        with self._lock:
+            connections = self._all_connections
+            self._all_connections = []
+
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+        for connection in connections:
+            try:
+                connection.close()
+            except sqlite3.Error:
+                pass
+
+    def _new_lease(self, connection):
+        return {"connection": connection, "depth": 1, "transactions": 0, "after_commit": []}
+
+    def _get_healthy_connection(self):
+        while True:
+            try:
+                connection, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+
+            if time.monotonic() - last_used < self.health_check_interval:
+                return connection
+
+            if self._is_healthy(connection):
+                return connection
+
+            logging.warning("Discarding unhealthy sqlite connection")
+            self._discard(connection)
+
+    def _is_healthy(self, connection):
+        try:
+            connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.database_name,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        for name, value in self.pragmas:
+            connection.execute("PRAGMA %s = %s" % (name, value))
+        with self._lock:
+            self._all_connections.append(connection)
+        return connection
+
+    def _discard(self, connection):
+        with self._lock:
+            if connection in self._all_connections:
+                self._all_connections.remove(connection)
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,40 @@
+"""Inspect or apply the numbered schema migrations.
+
+    python3 -m database.migrations [status|apply] [path/to/tx.db]
+
+status (the default) lists every migration and whether the database has it, and
+exits non-zero if any are pending.  apply brings the database up to
+SqliteClient.SCHEMA_VERSION; run it before restarting the app so workers start
+against a current schema.
+"""
+import sys
+
+from database.sqlite_client import SqliteClient
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else "status"
+    database_name = argv[2] if len(argv) > 2 else "sqlite/tx.db"
+    if command not in ("status", "apply"):
+        print(__doc__)
+        return 2
+
+    db_client = SqliteClient(database_name, migrate=False)
+
+    if command == "apply":
+        applied = db_client.run_migrations()
+        if not applied:
+            print("Already at schema version %d" % db_client.get_schema_version())
+        return 0
+
+    current = db_client.get_schema_version()
+    print("%s: schema version %d of %d" % (database_name, current, SqliteClient.SCHEMA_VERSION))
+    for version, description, _ in SqliteClient.MIGRATIONS:
+        status = "applied" if version <= current else "PENDING"
+        print("  %3d  %-8s %s" % (version, status, description))
+
+    return 1 if db_client.get_pending_migrations() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
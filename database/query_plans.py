@@ -0,0 +1,28 @@
+"""Check that the hot read queries are planned against their indexes.
+
+    python3 -m database.query_plans [path/to/tx.db]
+
+Exits non-zero if any query in SqliteClient.HOT_QUERY_INDEXES stops using its index.
+"""
+import sys
+
+from database.sqlite_client import SqliteClient
+
+
+def main(argv):
+    database_name = argv[1] if len(argv) > 1 else "sqlite/tx.db"
+    db_client = SqliteClient(database_name)
+
+    failed = False
+    for name, (index_name, plan, uses_index) in db_client.check_query_plans().items():
+        status = "ok" if uses_index else "MISSING " + index_name
+        print("%-40s %s" % (name, status))
+        for line in plan:
+            print("    " + line)
+        failed = failed or not uses_index
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
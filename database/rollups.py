@@ -0,0 +1,25 @@
+"""Rebuild every trigger-maintained table from tblTransaction.
+
+    python3 -m database.rollups [path/to/tx.db]
+
+Rebuilds tblCategoryMonthTotal (monthly category totals), tblTransactionSearch
+(the FTS index) and tblCounter (the uncategorized count).  They are normally
+kept current by triggers; this is the repair path if any of them is ever
+suspected of drifting.
+"""
+import sys
+
+from database.sqlite_client import SqliteClient
+
+
+def main(argv):
+    database_name = argv[1] if len(argv) > 1 else "sqlite/tx.db"
+    db_client = SqliteClient(database_name)
+    db_client.rebuild_category_month_totals()
+    db_client.rebuild_transaction_search()
+    db_client.rebuild_counters()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
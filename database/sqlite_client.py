@@ -1,5 +1,18 @@
+import concurrent.futures
+import fcntl
+import functools
+import itertools
+import logging
+import os
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 
+from database.connection_pool import ConnectionPool
+from database.write_queue import WriteQueue
+from utility.memo_helper import get_dedupe_key, normalize_memo
 from utility.time_helper import add_month, get_timestamp_for_datekey
 from utility.time_observer import TimeObserver
 
@@ -9,38 +22,586 @@ class ConnectionWrapper:
     _connection = None
     _last_rows = None
 
-    def __init__(self, database_name):
-        self._connection = sqlite3.connect(database_name)
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+        self._connection = pool.checkout()
         self._cursor = self._connection.cursor()
 
-    def execute_sql(self, sql: str):
+    def execute_sql(self, sql: str, params=()):
         if self._cursor is not None:
-            self._cursor.execute(sql)
+            self._cursor.execute(sql, params)
 
-        if self._connection is not None:
-            self._connection.commit()
+        self._commit_unless_in_transaction()
+
+    def execute_many(self, sql: str, rows):
+        if self._cursor is not None:
+            self._cursor.executemany(sql, rows)
+
+        self._commit_unless_in_transaction()
+
+    def _commit_unless_in_transaction(self):
+        if self._connection is not None and not self._pool.in_transaction():
+            self._pool.commit(self._connection)
 
     def get_results(self):
         return self._cursor.fetchall()
 
     def wrap_it_up(self):
         self._cursor.close()
-        self._connection.close()
+        self._pool.release()
+
+
+def serialized_write(method):
+    """Send a SqliteClient write method through the client's write queue, if it has one."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.run_serialized(method, self, *args, **kwargs)
+
+    return wrapper
 
 
 class SqliteClient:
 
-    def __init__(self, database_name):
+    INSERT_CHUNK_SIZE = 500
+
+    # Compiled statements kept per pooled connection.  Every query binds its values as
+    # parameters, so each distinct SQL text is parsed and planned once per connection;
+    # this just needs to be comfortably above the number of distinct statements.
+    STATEMENT_CACHE_SIZE = 256
+
+    # Named PRAGMA sets applied, in order, to every pooled connection.  A deployment picks one with
+    # the pragma_profile argument or the MONEYPIT_SQLITE_PROFILE environment variable.
+    # WAL lets readers keep serving pages while an import writes; NORMAL sync is still
+    # crash-safe in WAL mode (a power cut can only lose the last commits).
+    PRAGMA_PROFILES = {
+        "default": [
+            ("busy_timeout", 5000),
+            ("journal_mode", "WAL"),
+            ("synchronous", "NORMAL"),
+            ("cache_size", -64000),  # KiB, so ~64MB per connection
+            ("mmap_size", 268435456),
+            ("temp_store", "MEMORY"),
+        ],
+        "low_memory": [
+            ("busy_timeout", 5000),
+            ("journal_mode", "WAL"),
+            ("synchronous", "NORMAL"),
+            ("cache_size", -8000),
+            ("mmap_size", 0),
+            ("temp_store", "DEFAULT"),
+        ],
+        # SQLite's stock settings, rollback journal included
+        "legacy": [
+            ("busy_timeout", 5000),
+            ("journal_mode", "DELETE"),
+            ("synchronous", "FULL"),
+        ],
+    }
+    DEFAULT_PRAGMA_PROFILE = "default"
+
+    WAL_CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+    WAL_CHECKPOINT_INTERVAL = 300
+
+    # snapshot() copies this many pages per backup step, pausing BACKUP_STEP_SLEEP
+    # seconds between steps so other connections get the database in between
+    BACKUP_STEP_PAGES = 1024
+    BACKUP_STEP_SLEEP = 0.005
+
+    # Most queued writes the writer thread commits together
+    WRITE_BATCH_SIZE = 64
+    # run_serialized() gives up waiting on the writer after this many busy_timeouts
+    WRITE_TIMEOUT_BUSY_TIMEOUTS = 6
+
+    # tblDataVersion counters; bumped by every write to the data they name so
+    # in-process caches (e.g. Categorizer's match-string index) know when to rebuild
+    MATCH_STRINGS_VERSION = "match_strings"
+    KEYWORD_RULES_VERSION = "keyword_rules"
+    # Bumped by every commit that wrote anything, whatever it touched
+    DATA_VERSION = "data"
+
+    # tblCounter row holding the number of live, uncategorized transactions
+    UNCATEGORIZED_COUNTER = "uncategorized"
+
+    KEYWORD_RULE_MATCH_TYPES = ("substring", "prefix", "regex")
+
+    # (pattern, category name) keyword fallbacks that used to be hard-coded in the
+    # Categorizer.  Seeded into tblCategoryKeywordRule, in this priority order, for
+    # whichever of the categories exist when the table is created, and for each of the
+    # others as insert_category() creates it.
+    DEFAULT_CATEGORY_KEYWORD_RULES = [
+        ("amzn mktp", "amazon"),
+        ("amazon com", "amazon"),
+        ("amz descriptor", "amazon"),
+        ("amzn", "amazon"),
+        ("amazon prime", "amazon"),
+        ("exxonmobil", "gasoline"),
+        ("nintendo", "entertainment"),
+        ("wf wayfair", "home improvement"),
+        ("target", "target"),
+        ("kindle svcs", "entertainment"),
+        ("starbucks store", "coffee out"),
+        ("starbucks", "coffee out"),
+        ("hannaford", "groceries"),
+        ("wholefoods", "groceries"),
+        ("whole foods market", "groceries"),
+        ("wayfair", "home improvement"),
+        ("cvs pharmacy", "healthcare"),
+        ("andover water", "water bill"),
+        (" alma ", "healthcare"),
+        ("chewy com", "pet expenses"),
+        ("bbss ", "kid recreation"),
+        ("mahoneys", "home improvement"),
+        ("the home depot", "home improvement"),
+        ("supercuts", "haircut"),
+        ("vzwrlss", "cell phone plan"),
+        ("parking", "parking"),
+        ("eversource", "natural gas"),
+        ("ngrid05", "electricity bill"),
+        ("venmo", "venmo"),
+        ("check", "check"),
+    ]
+
+    # Secondary indexes created (if missing) at the end of run_migrations.
+    # The partial indexes only cover live rows, which is all the read paths ever ask for;
+    # DateDeleted is carried as a key column so the planner can treat them as covering.
+    INDEXES = [
+        (
+            "idxTransactionDedupeKey",
+            """CREATE UNIQUE INDEX IF NOT EXISTS idxTransactionDedupeKey
+            ON tblTransaction(TxDedupeKey)
+            WHERE DateDeleted IS NULL""",
+        ),
+        (
+            "idxTransactionLiveDate",
+            """CREATE INDEX IF NOT EXISTS idxTransactionLiveDate
+            ON tblTransaction(TxDateTimestamp, TxCategoryID, TxDenomination, DateDeleted)
+            WHERE DateDeleted IS NULL""",
+        ),
+        (
+            "idxTransactionLiveCategory",
+            """CREATE INDEX IF NOT EXISTS idxTransactionLiveCategory
+            ON tblTransaction(TxCategoryID, TxDateTimestamp)
+            WHERE DateDeleted IS NULL""",
+        ),
+        (
+            "idxTransactionLiveCategoryMerchant",
+            """CREATE INDEX IF NOT EXISTS idxTransactionLiveCategoryMerchant
+            ON tblTransaction(TxCategoryID, MerchantID, TxDateTimestamp)
+            WHERE DateDeleted IS NULL""",
+        ),
+        (
+            "idxTransactionLiveMemoNormalized",
+            """CREATE INDEX IF NOT EXISTS idxTransactionLiveMemoNormalized
+            ON tblTransaction(TxMemoNormalized)
+            WHERE DateDeleted IS NULL""",
+        ),
+        (
+            "idxCategoryMatchStringNormalized",
+            """CREATE INDEX IF NOT EXISTS idxCategoryMatchStringNormalized
+            ON tblCategoryMatchString(MatchStringNormalized)""",
+        ),
+        (
+            "idxMerchantNormalized",
+            """CREATE INDEX IF NOT EXISTS idxMerchantNormalized
+            ON tblMerchant(MemoNormalized)""",
+        ),
+        (
+            "idxTransactionInputFile",
+            """CREATE INDEX IF NOT EXISTS idxTransactionInputFile
+            ON tblTransaction(InputFileID)""",
+        ),
+    ]
+
+    # Indexes superseded by one in INDEXES; dropped by create_indexes_if_not_exist
+    OBSOLETE_INDEXES = ["idxTransactionLiveCategoryMemo"]
+
+    # Rollup of live, categorized transactions per local calendar month.  Kept current by
+    # the triggers below, so every write path (ingest, recategorize, delete, rule backfills)
+    # maintains it without knowing about it.  Month keys use SQLite's 'localtime', which
+    # matches the Python side's datetime.fromtimestamp() date keys.
+    ROLLUP_TRIGGERS = [
+        (
+            "trgCategoryMonthTotalInsert",
+            """CREATE TRIGGER IF NOT EXISTS trgCategoryMonthTotalInsert
+            AFTER INSERT ON tblTransaction
+            WHEN NEW.TxCategoryID IS NOT NULL AND NEW.DateDeleted IS NULL
+            BEGIN
+                INSERT INTO tblCategoryMonthTotal (MonthKey, CategoryID, NetSum, DebitSum, CreditSum, TxCount)
+                VALUES (
+                    strftime('%Y-%m', NEW.TxDateTimestamp, 'unixepoch', 'localtime'),
+                    NEW.TxCategoryID,
+                    NEW.TxDenomination,
+                    MIN(NEW.TxDenomination, 0),
+                    MAX(NEW.TxDenomination, 0),
+                    1
+                )
+                ON CONFLICT(MonthKey, CategoryID) DO UPDATE SET
+                    NetSum = NetSum + excluded.NetSum,
+                    DebitSum = DebitSum + excluded.DebitSum,
+                    CreditSum = CreditSum + excluded.CreditSum,
+                    TxCount = TxCount + 1;
+            END""",
+        ),
+        (
+            "trgCategoryMonthTotalDelete",
+            """CREATE TRIGGER IF NOT EXISTS trgCategoryMonthTotalDelete
+            AFTER DELETE ON tblTransaction
+            WHEN OLD.TxCategoryID IS NOT NULL AND OLD.DateDeleted IS NULL
+            BEGIN
+                UPDATE tblCategoryMonthTotal SET
+                    NetSum = NetSum - OLD.TxDenomination,
+                    DebitSum = DebitSum - MIN(OLD.TxDenomination, 0),
+                    CreditSum = CreditSum - MAX(OLD.TxDenomination, 0),
+                    TxCount = TxCount - 1
+                WHERE MonthKey = strftime('%Y-%m', OLD.TxDateTimestamp, 'unixepoch', 'localtime')
+                  AND CategoryID = OLD.TxCategoryID;
+                DELETE FROM tblCategoryMonthTotal
+                WHERE MonthKey = strftime('%Y-%m', OLD.TxDateTimestamp, 'unixepoch', 'localtime')
+                  AND CategoryID = OLD.TxCategoryID
+                  AND TxCount <= 0;
+            END""",
+        ),
+        (
+            "trgCategoryMonthTotalUpdate",
+            """CREATE TRIGGER IF NOT EXISTS trgCategoryMonthTotalUpdate
+            AFTER UPDATE OF TxCategoryID, TxDenomination, TxDateTimestamp, DateDeleted ON tblTransaction
+            BEGIN
+                UPDATE tblCategoryMonthTotal SET
+                    NetSum = NetSum - OLD.TxDenomination,
+                    DebitSum = DebitSum - MIN(OLD.TxDenomination, 0),
+                    CreditSum = CreditSum - MAX(OLD.TxDenomination, 0),
+                    TxCount = TxCount - 1
+                WHERE MonthKey = strftime('%Y-%m', OLD.TxDateTimestamp, 'unixepoch', 'localtime')
+                  AND CategoryID = OLD.TxCategoryID
+                  AND OLD.DateDeleted IS NULL;
+                DELETE FROM tblCategoryMonthTotal
+                WHERE MonthKey = strftime('%Y-%m', OLD.TxDateTimestamp, 'unixepoch', 'localtime')
+                  AND CategoryID = OLD.TxCategoryID
+                  AND TxCount <= 0;
+                INSERT INTO tblCategoryMonthTotal (MonthKey, CategoryID, NetSum, DebitSum, CreditSum, TxCount)
+                SELECT
+                    strftime('%Y-%m', NEW.TxDateTimestamp, 'unixepoch', 'localtime'),
+                    NEW.TxCategoryID,
+                    NEW.TxDenomination,
+                    MIN(NEW.TxDenomination, 0),
+                    MAX(NEW.TxDenomination, 0),
+                    1
+                WHERE NEW.TxCategoryID IS NOT NULL AND NEW.DateDeleted IS NULL
+                ON CONFLICT(MonthKey, CategoryID) DO UPDATE SET
+                    NetSum = NetSum + excluded.NetSum,
+                    DebitSum = DebitSum + excluded.DebitSum,
+                    CreditSum = CreditSum + excluded.CreditSum,
+                    TxCount = TxCount + 1;
+            END""",
+        ),
+    ]
+
+    # Live uncategorized transaction count, kept in tblCounter so the nav badge on every
+    # page is a primary-key read rather than a COUNT(*) over tblTransaction.
+    COUNTER_TRIGGERS = [
+        (
+            "trgUncategorizedCountInsert",
+            """CREATE TRIGGER IF NOT EXISTS trgUncategorizedCountInsert
+            AFTER INSERT ON tblTransaction
+            WHEN NEW.TxCategoryID IS NULL AND NEW.DateDeleted IS NULL
+            BEGIN
+                UPDATE tblCounter SET Value = Value + 1 WHERE Name = 'uncategorized';
+            END""",
+        ),
+        (
+            "trgUncategorizedCountDelete",
+            """CREATE TRIGGER IF NOT EXISTS trgUncategorizedCountDelete
+            AFTER DELETE ON tblTransaction
+            WHEN OLD.TxCategoryID IS NULL AND OLD.DateDeleted IS NULL
+            BEGIN
+                UPDATE tblCounter SET Value = Value - 1 WHERE Name = 'uncategorized';
+            END""",
+        ),
+        (
+            "trgUncategorizedCountUpdate",
+            """CREATE TRIGGER IF NOT EXISTS trgUncategorizedCountUpdate
+            AFTER UPDATE OF TxCategoryID, DateDeleted ON tblTransaction
+            WHEN (OLD.TxCategoryID IS NULL AND OLD.DateDeleted IS NULL)
+              != (NEW.TxCategoryID IS NULL AND NEW.DateDeleted IS NULL)
+            BEGIN
+                UPDATE tblCounter
+                SET Value = Value
+                    + (NEW.TxCategoryID IS NULL AND NEW.DateDeleted IS NULL)
+                    - (OLD.TxCategoryID IS NULL AND OLD.DateDeleted IS NULL)
+                WHERE Name = 'uncategorized';
+            END""",
+        ),
+    ]
+
+    # Full-text index over live transactions, keyed by rowid = TxID.  Category and source
+    # names are denormalized into it so search results never join back for them; the
+    # triggers below keep it in step with every write to tblTransaction and with renames.
+    SEARCH_TRIGGERS = [
+        (
+            "trgTransactionSearchInsert",
+            """CREATE TRIGGER IF NOT EXISTS trgTransactionSearchInsert
+            AFTER INSERT ON tblTransaction
+            WHEN NEW.DateDeleted IS NULL
+            BEGIN
+                INSERT INTO tblTransactionSearch (rowid, TxMemoRaw, TxCustomMemo, CategoryName, SourceBankName)
+                VALUES (
+                    NEW.TxID,
+                    COALESCE(NEW.TxMemoRaw, ''),
+                    COALESCE(NEW.TxCustomMemo, ''),
+                    COALESCE((SELECT Name FROM tblCategory WHERE CategoryID = NEW.TxCategoryID), ''),
+                    COALESCE((
+                        SELECT sb.Name FROM tblInputFile inputFile
+                        INNER JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
+                        WHERE inputFile.InputFileID = NEW.InputFileID
+                    ), '')
+                );
+            END""",
+        ),
+        (
+            "trgTransactionSearchDelete",
+            """CREATE TRIGGER IF NOT EXISTS trgTransactionSearchDelete
+            AFTER DELETE ON tblTransaction
+            BEGIN
+                DELETE FROM tblTransactionSearch WHERE rowid = OLD.TxID;
+            END""",
+        ),
+        (
+            "trgTransactionSearchUpdate",
+            """CREATE TRIGGER IF NOT EXISTS trgTransactionSearchUpdate
+            AFTER UPDATE OF TxMemoRaw, TxCustomMemo, TxCategoryID, InputFileID, DateDeleted ON tblTransaction
+            BEGIN
+                DELETE FROM tblTransactionSearch WHERE rowid = OLD.TxID;
+                INSERT INTO tblTransactionSearch (rowid, TxMemoRaw, TxCustomMemo, CategoryName, SourceBankName)
+                SELECT
+                    NEW.TxID,
+                    COALESCE(NEW.TxMemoRaw, ''),
+                    COALESCE(NEW.TxCustomMemo, ''),
+                    COALESCE((SELECT Name FROM tblCategory WHERE CategoryID = NEW.TxCategoryID), ''),
+                    COALESCE((
+                        SELECT sb.Name FROM tblInputFile inputFile
+                        INNER JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
+                        WHERE inputFile.InputFileID = NEW.InputFileID
+                    ), '')
+                WHERE NEW.DateDeleted IS NULL;
+            END""",
+        ),
+        (
+            "trgTransactionSearchCategoryRename",
+            """CREATE TRIGGER IF NOT EXISTS trgTransactionSearchCategoryRename
+            AFTER UPDATE OF Name ON tblCategory
+            BEGIN
+                UPDATE tblTransactionSearch SET CategoryName = COALESCE(NEW.Name, '')
+                WHERE rowid IN (
+                    SELECT TxID FROM tblTransaction
+                    WHERE TxCategoryID = NEW.CategoryID AND DateDeleted IS NULL
+                );
+            END""",
+        ),
+        (
+            "trgTransactionSearchSourceBankRename",
+            """CREATE TRIGGER IF NOT EXISTS trgTransactionSearchSourceBankRename
+            AFTER UPDATE OF Name ON tblSourceBank
+            BEGIN
+                UPDATE tblTransactionSearch SET SourceBankName = COALESCE(NEW.Name, '')
+                WHERE rowid IN (
+                    SELECT tx.TxID FROM tblTransaction tx
+                    INNER JOIN tblInputFile inputFile ON inputFile.InputFileID = tx.InputFileID
+                    WHERE inputFile.SourceBankID = NEW.SourceBankID AND tx.DateDeleted IS NULL
+                );
+            END""",
+        ),
+    ]
+
+    # Hot read query -> (table alias, index its plan must search); checked by check_query_plans()
+    HOT_QUERY_INDEXES = {
+        "get_data_for_time_slice": ("tx", "idxTransactionLiveDate"),
+        "get_category_month_totals": ("r", "sqlite_autoindex_tblCategoryMonthTotal_1"),
+        "get_category_tx_sum_for_month": ("r", "sqlite_autoindex_tblCategoryMonthTotal_1"),
+        "get_category_6mo_avg_monthly_spend": ("r", "sqlite_autoindex_tblCategoryMonthTotal_1"),
+        "get_uncategorized_transactions": ("tx", "idxTransactionLiveCategory"),
+        "get_uncategorized_transactions_count": ("c", "sqlite_autoindex_tblCounter_1"),
+        "get_next_uncategorized_group": ("tx", "idxTransactionLiveCategoryMerchant"),
+        "get_match_strings_with_tx_counts": ("tx", "idxTransactionLiveMemoNormalized"),
+    }
+
+    # Numbered schema migrations, applied in order to bring PRAGMA user_version up to
+    # SCHEMA_VERSION.  Only ever append: never renumber or change a shipped step.  Each
+    # step checks the schema before touching it, so a run that dies part-way is simply
+    # repeated from the last recorded version.  Steps 1-6 cover every schema the app
+    # shipped before versioning, which all start out at user_version 0.
+    MIGRATIONS = [
+        (1, "Create base tables", "create_tables_if_not_exist"),
+        (2, "Legacy tblTransaction columns", "_migrate_legacy_transaction_columns"),
+        (3, "Transaction dedupe keys", "_migrate_dedupe_keys"),
+        (4, "Categorization provenance columns", "_migrate_categorization_provenance"),
+        (5, "Normalized memo columns", "_migrate_normalized_memos"),
+        (6, "tblMerchant memo dictionary", "_migrate_merchants"),
+        (7, "Default keyword rules for categories created later", "_migrate_default_keyword_rules"),
+    ]
+    SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+    def __init__(self, database_name, pool_size=5, pragma_profile=None, migrate=True):
+        if pragma_profile is None:
+            pragma_profile = os.environ.get(
+                "MONEYPIT_SQLITE_PROFILE", self.DEFAULT_PRAGMA_PROFILE
+            )
+        if pragma_profile not in self.PRAGMA_PROFILES:
+            raise ValueError(
+                "Unknown sqlite PRAGMA profile %r (expected one of %s)"
+                % (pragma_profile, ", ".join(sorted(self.PRAGMA_PROFILES)))
+            )
+
         self.database_name = database_name
-        self.create_tables_if_not_exist()
-        self.run_migrations()
+        self.pragma_profile = pragma_profile
+        self.pool = ConnectionPool(
+            database_name,
+            size=pool_size,
+            pragmas=self.PRAGMA_PROFILES[pragma_profile],
+            cached_statements=self.STATEMENT_CACHE_SIZE,
+        )
+        self._checkpoint_thread = None
+        # Set by start_writer(); until then writes run on the calling thread
+        self.writer = None
+        busy_timeout_ms = dict(self.PRAGMA_PROFILES[pragma_profile]).get("busy_timeout", 5000)
+        self.write_timeout = busy_timeout_ms / 1000 * self.WRITE_TIMEOUT_BUSY_TIMEOUTS
+        # tblMerchant MemoRaw -> MerchantID for every merchant this process has seen
+        self._merchant_ids = {}
+        self._merchant_ids_lock = threading.Lock()
+
+        schema_version = self.get_schema_version()
+        if migrate and schema_version < self.SCHEMA_VERSION:
+            self.run_migrations()
+        elif schema_version > self.SCHEMA_VERSION:
+            logging.warning(
+                "%s is at schema version %d, newer than this code's %d"
+                % (database_name, schema_version, self.SCHEMA_VERSION)
+            )
+
+        self.pool.before_commit = self._bump_global_data_version
+
+    def transaction(self):
+        """Context manager that commits every write made inside it at once."""
+        return self.pool.transaction()
+
+    def get_pragma(self, name):
+        connection = ConnectionWrapper(self.pool)
+        try:
+            connection.execute_sql("PRAGMA %s" % name)
+            results = connection.get_results()
+            return results[0][0] if results else None
+        finally:
+            connection.wrap_it_up()
+
+    def checkpoint_wal(self, mode="PASSIVE"):
+        """Copy committed WAL frames back into the database file.
+
+        Returns (busy, wal frames, frames checkpointed) as reported by SQLite; the
+        frame counts are -1 when the database isn't in WAL mode.  PASSIVE never waits on readers or
+        writers; TRUNCATE also empties the -wal file.
+        """
+        mode = mode.upper()
+        if mode not in self.WAL_CHECKPOINT_MODES:
+            raise ValueError("Unknown wal_checkpoint mode %r" % mode)
+
+        connection = ConnectionWrapper(self.pool)
+        try:
+            connection.execute_sql("PRAGMA wal_checkpoint(%s)" % mode)
+            return tuple(connection.get_results()[0])
+        finally:
+            connection.wrap_it_up()
+
+    def snapshot(self):
+        """Return a consistent copy of the whole database file, as bytes.
+
+        Uses SQLite's online backup API into an in-memory database, so commits still
+        sitting in the WAL are included and a concurrent write can never leave the
+        copy torn (SQLite restarts the backup if another connection writes mid-way).
+        """
+        destination = sqlite3.connect(":memory:")
+        connection = self.pool.checkout()
+        try:
+            connection.backup(
+                destination, pages=self.BACKUP_STEP_PAGES, sleep=self.BACKUP_STEP_SLEEP
+            )
+            return destination.serialize()
+        finally:
+            self.pool.release()
+            destination.close()
+
+    def start_wal_checkpoints(self, interval=WAL_CHECKPOINT_INTERVAL):
+        """Run a PASSIVE checkpoint every interval seconds on a daemon thread.
+
+        SQLite's own auto-checkpoint only runs at the end of a commit, inside the
+        writer; this keeps the WAL short between imports so reads stay fast.  Does
+        nothing unless the database is in WAL mode, or if already started.
+        """
+        if self._checkpoint_thread is not None:
+            return
+        if str(self.get_pragma("journal_mode")).lower() != "wal":
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    busy, frames, checkpointed = self.checkpoint_wal("PASSIVE")
+                    logging.debug(
+                        "wal_checkpoint: %d of %d frames (busy=%d)"
+                        % (checkpointed, frames, busy)
+                    )
+                except Exception:
+                    logging.exception("wal_checkpoint failed")
+
+        self._checkpoint_thread = threading.Thread(
+            target=run, name="sqlite-wal-checkpoint", daemon=True
+        )
+        self._checkpoint_thread.start()
+
+    def start_writer(self, max_batch=WRITE_BATCH_SIZE):
+        """Serialize this client's writes through a WriteQueue from now on.
+
+        Every @serialized_write method (and run_serialized job) then runs on one
+        writer thread, queued calls sharing a commit, under a lock file that other
+        processes starting a writer on the same database also take.  Does nothing
+        if already started.
+        """
+        if self.writer is None:
+            self.writer = WriteQueue(
+                self.pool, self.database_name + ".write.lock", max_batch=max_batch
+            )
+            self.writer.start()
+
+    def run_serialized(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) on the writer thread and wait for its result.
+
+        Runs it right here instead when there's no writer, when already on the
+        writer thread, or when this thread is inside its own transaction (whose
+        writes must stay on its own connection to commit together).  Raises
+        concurrent.futures.TimeoutError after write_timeout seconds, so a stuck
+        writer can't hang every request thread with it.
+        """
+        if (
+            self.writer is None
+            or self.writer.runs_here()
+            or self.pool.in_transaction()
+        ):
+            return fn(*args, **kwargs)
+
+        future = self.writer.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.write_timeout)
+        except concurrent.futures.TimeoutError:
+            # Still queued: make sure it never runs.  Already running: it may yet commit.
+            future.cancel()
+            raise
 
     def create_tables_if_not_exist(self):
         sql = """
         SELECT name FROM sqlite_master WHERE type = \'table\'
         """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         connection.execute_sql(sql)
 
         results = connection.get_results()
@@ -64,8 +625,9 @@ class SqliteClient:
 
         for bank in source_bank_seed:
             connection.execute_sql(
-                "INSERT OR IGNORE INTO tblSourceBank (Name) VALUES ('%s');" % bank
+                "INSERT OR IGNORE INTO tblSourceBank (Name) VALUES (?);", (bank,)
             )
+
             print("Ensured that  " + bank + " was in tblSourceBank")
 
         if "tblCategory" not in tables:
@@ -108,6 +670,12 @@ class SqliteClient:
                 "InputFileID"	INTEGER,
                 "SourceBankID"	INTEGER,
                 "DateDeleted"	TEXT,
+                "TxDedupeKey"	TEXT,
+                "TxCategoryMatchID"	INTEGER,
+                "TxCategoryKeywordRuleID"	INTEGER,
+                "TxMemoNormalized"	TEXT,
+                "MerchantID"	INTEGER,
+                FOREIGN KEY("MerchantID") REFERENCES "tblMerchant"("MerchantID"),
                 FOREIGN KEY("InputFileID") REFERENCES "tblInputFile"("InputFileID"),
                 FOREIGN KEY("TxCategoryID") REFERENCES "tblCategory"("CategoryID"),
                 FOREIGN KEY("SourceBankID") REFERENCES "tblSourceBank"("SourceBankID"),
@@ -124,6 +692,7 @@ class SqliteClient:
                 "MatchID"	INTEGER,
                 "CategoryID"	INT,
                 "MatchString"  TEXT,
+                "MatchStringNormalized"  TEXT,
                 FOREIGN KEY("CategoryID") REFERENCES "tblCategory"("CategoryID"),
                 PRIMARY KEY("MatchID" AUTOINCREMENT),
                 UNIQUE(CategoryID, MatchString)
@@ -190,16 +759,153 @@ class SqliteClient:
             connection.execute_sql(table_sql)
             print("Created tblMonthlyBudgetLine")
 
+        if "tblCategoryMonthTotal" not in tables:
+            self._create_category_month_total_table(connection)
+
+        if "tblDataVersion" not in tables:
+            table_sql = """
+            CREATE TABLE tblDataVersion (
+                Name TEXT PRIMARY KEY,
+                Version INTEGER NOT NULL DEFAULT 0
+            );
+            """
+            connection.execute_sql(table_sql)
+            print("Created tblDataVersion")
+
+        if "tblCategoryKeywordRule" not in tables:
+            table_sql = """
+            CREATE TABLE tblCategoryKeywordRule (
+                RuleID INTEGER PRIMARY KEY AUTOINCREMENT,
+                Pattern TEXT NOT NULL,
+                MatchType TEXT NOT NULL DEFAULT 'substring'
+                    CHECK (MatchType IN ('substring', 'prefix', 'regex')),
+                CategoryID INTEGER NOT NULL,
+                AmountMin REAL NULL,
+                AmountMax REAL NULL,
+                SourceBankID INTEGER NULL,
+                Priority INTEGER NOT NULL DEFAULT 100,
+                AutoApply INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY(CategoryID) REFERENCES tblCategory(CategoryID),
+                FOREIGN KEY(SourceBankID) REFERENCES tblSourceBank(SourceBankID)
+            );
+            """
+            connection.execute_sql(table_sql)
+            self._seed_default_keyword_rules(connection)
+            print("Created tblCategoryKeywordRule")
+
+        if "tblCounter" not in tables:
+            table_sql = """
+            CREATE TABLE tblCounter (
+                Name TEXT PRIMARY KEY,
+                Value INTEGER NOT NULL DEFAULT 0
+            );
+            """
+            connection.execute_sql(table_sql)
+            print("Created tblCounter")
+
+        if "tblMerchant" not in tables:
+            table_sql = """
+            CREATE TABLE tblMerchant (
+                MerchantID INTEGER PRIMARY KEY AUTOINCREMENT,
+                MemoRaw TEXT NOT NULL,
+                MemoNormalized TEXT NOT NULL,
+                DisplayName TEXT NULL,
+                UNIQUE(MemoRaw)
+            );
+            """
+            connection.execute_sql(table_sql)
+            print("Created tblMerchant")
+
+        if "tblTransactionSearch" not in tables:
+            connection.execute_sql("""
+            CREATE VIRTUAL TABLE tblTransactionSearch USING fts5(
+                TxMemoRaw,
+                TxCustomMemo,
+                CategoryName,
+                SourceBankName,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            );
+            """)
+            print("Created tblTransactionSearch")
+
         connection.wrap_it_up()
 
+    def _create_category_month_total_table(self, connection):
+        connection.execute_sql("""
+        CREATE TABLE tblCategoryMonthTotal (
+            MonthKey TEXT NOT NULL,
+            CategoryID INTEGER NOT NULL,
+            NetSum REAL NOT NULL DEFAULT 0,
+            DebitSum REAL NOT NULL DEFAULT 0,
+            CreditSum REAL NOT NULL DEFAULT 0,
+            TxCount INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (MonthKey, CategoryID),
+            FOREIGN KEY(CategoryID) REFERENCES tblCategory(CategoryID)
+        );
+        """)
+        print("Created tblCategoryMonthTotal")
+
+    def get_schema_version(self):
+        return self.get_pragma("user_version")
+
+    def get_pending_migrations(self):
+        """(version, description) of every migration the database doesn't have yet."""
+        current = self.get_schema_version()
+        return [(v, description) for v, description, _ in self.MIGRATIONS if v > current]
+
     def run_migrations(self):
+        """Apply pending MIGRATIONS in order; returns the versions applied.
+
+        Runs under an exclusive lock file next to the database, so when several
+        workers start at once one of them migrates and the others wait, then find
+        the schema already current.  Indexes and triggers are brought up to date
+        after the steps, before the new version is recorded.
+        """
+        # Steps run before tblDataVersion exists on old schemas, so the per-commit
+        # data version bump is off until they're done
+        before_commit, self.pool.before_commit = self.pool.before_commit, None
+        try:
+            with self._schema_lock():
+                current = self.get_schema_version()
+                pending = [m for m in self.MIGRATIONS if m[0] > current]
+                if not pending:
+                    return []
+
+                for version, description, method_name in pending:
+                    print("Applying migration %d: %s" % (version, description))
+                    getattr(self, method_name)()
 
+                self._ensure_indexes_and_triggers()
+
+                connection = ConnectionWrapper(self.pool)
+                try:
+                    # PRAGMA arguments can't be bound
+                    connection.execute_sql("PRAGMA user_version = %d" % pending[-1][0])
+                finally:
+                    connection.wrap_it_up()
+        finally:
+            self.pool.before_commit = before_commit
+
+        print("Schema now at version %d" % pending[-1][0])
+        return [m[0] for m in pending]
+
+    @contextmanager
+    def _schema_lock(self):
+        with open(self.database_name + ".migrate.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _migrate_legacy_transaction_columns(self):
         if "DateDeleted" not in self.get_columns_for_table("tblTransaction"):
             sql = """
             ALTER TABLE tblTransaction
             ADD COLUMN DateDeleted TEXT;
             """
-            connection = ConnectionWrapper(self.database_name)
+            connection = ConnectionWrapper(self.pool)
             connection.execute_sql(sql)
             connection.wrap_it_up()
             print("Migrated tblTransaction.DateDeleted")
@@ -207,7 +913,7 @@ class SqliteClient:
         # Add SourceBankID and enforce unique (denom, date, memo) per source across files
         cols = self.get_columns_for_table("tblTransaction")
         if cols and "SourceBankID" not in cols:
-            connection = ConnectionWrapper(self.database_name)
+            connection = ConnectionWrapper(self.pool)
             try:
                 connection.execute_sql(
                     "ALTER TABLE tblTransaction ADD COLUMN SourceBankID INTEGER;"
@@ -231,7 +937,7 @@ class SqliteClient:
         cols = self.get_columns_for_table("tblTransaction")
         if cols:
             if "CustomMemo" in cols and "TxCustomMemo" not in cols:
-                connection = ConnectionWrapper(self.database_name)
+                connection = ConnectionWrapper(self.pool)
                 try:
                     connection.execute_sql(
                         "ALTER TABLE tblTransaction RENAME COLUMN CustomMemo TO TxCustomMemo;"
@@ -240,7 +946,7 @@ class SqliteClient:
                     connection.wrap_it_up()
                 print("Migrated tblTransaction.CustomMemo -> TxCustomMemo")
             elif "TxCustomMemo" not in cols:
-                connection = ConnectionWrapper(self.database_name)
+                connection = ConnectionWrapper(self.pool)
                 try:
                     connection.execute_sql(
                         "ALTER TABLE tblTransaction ADD COLUMN TxCustomMemo TEXT;"
@@ -250,7 +956,7 @@ class SqliteClient:
                 print("Migrated tblTransaction.TxCustomMemo")
 
         # Create tblCoreExpenseCategory if missing and seed (for existing DBs)
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql("""
                 CREATE TABLE IF NOT EXISTS tblCoreExpenseCategory (
@@ -265,14 +971,489 @@ class SqliteClient:
                     cid = self.get_category_id(name)
                     if cid:
                         connection.execute_sql(
-                            f"INSERT OR IGNORE INTO tblCoreExpenseCategory (CategoryID) VALUES ({cid});"
+                            "INSERT OR IGNORE INTO tblCoreExpenseCategory (CategoryID) VALUES (?);",
+                            (cid,),
                         )
                 print("Migrated tblCoreExpenseCategory seeded")
         finally:
             connection.wrap_it_up()
 
+    def _migrate_dedupe_keys(self):
+        # Hash of (denom, date, normalized memo, source) so ingest dedupes with one index probe
+        if "TxDedupeKey" not in self.get_columns_for_table("tblTransaction"):
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    "ALTER TABLE tblTransaction ADD COLUMN TxDedupeKey TEXT;"
+                )
+            finally:
+                connection.wrap_it_up()
+            print("Migrated tblTransaction.TxDedupeKey")
+
+        self._backfill_dedupe_keys()
+
+    def _migrate_categorization_provenance(self):
+        # Which rule categorized a transaction automatically (NULL once a person sets it)
+        cols = self.get_columns_for_table("tblTransaction")
+        for column in ["TxCategoryMatchID", "TxCategoryKeywordRuleID"]:
+            if column not in cols:
+                connection = ConnectionWrapper(self.pool)
+                try:
+                    connection.execute_sql(
+                        f"ALTER TABLE tblTransaction ADD COLUMN {column} INTEGER;"
+                    )
+                finally:
+                    connection.wrap_it_up()
+                print("Migrated tblTransaction." + column)
+
+        if "AutoApply" not in self.get_columns_for_table("tblCategoryKeywordRule"):
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    "ALTER TABLE tblCategoryKeywordRule ADD COLUMN AutoApply INTEGER NOT NULL DEFAULT 0;"
+                )
+            finally:
+                connection.wrap_it_up()
+            print("Migrated tblCategoryKeywordRule.AutoApply")
+
+    def _migrate_normalized_memos(self):
+        # normalize_memo() form of the memo / match string, so rule joins are index equality
+        for table, column in [
+            ("tblTransaction", "TxMemoNormalized"),
+            ("tblCategoryMatchString", "MatchStringNormalized"),
+        ]:
+            if column not in self.get_columns_for_table(table):
+                connection = ConnectionWrapper(self.pool)
+                try:
+                    connection.execute_sql(
+                        f"ALTER TABLE {table} ADD COLUMN {column} TEXT;"
+                    )
+                finally:
+                    connection.wrap_it_up()
+                print("Migrated %s.%s" % (table, column))
+
+        self._backfill_normalized_memos()
+
+    def _migrate_merchants(self):
+        # Each distinct raw memo interned once in tblMerchant
+        if "MerchantID" not in self.get_columns_for_table("tblTransaction"):
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    "ALTER TABLE tblTransaction ADD COLUMN MerchantID INTEGER REFERENCES tblMerchant(MerchantID);"
+                )
+            finally:
+                connection.wrap_it_up()
+            print("Migrated tblTransaction.MerchantID")
+
+        self._backfill_merchant_ids()
+
+    def _migrate_default_keyword_rules(self):
+        # Before step 7 the defaults were only seeded for categories that existed when
+        # tblCategoryKeywordRule was created
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                added = self._seed_default_keyword_rules(connection)
+            finally:
+                connection.wrap_it_up()
+        print("Migrated default keyword rules: %d added" % added)
+
+    def _seed_default_keyword_rules(self, connection, category_name=None):
+        """Add the DEFAULT_CATEGORY_KEYWORD_RULES for every existing category they name.
+
+        Only for category_name when it's given.  A default already on file for its
+        category isn't added twice.  Returns the number of rules added.
+        """
+        added = 0
+        for position, (pattern, rule_category) in enumerate(
+            self.DEFAULT_CATEGORY_KEYWORD_RULES
+        ):
+            if category_name is not None and rule_category != category_name:
+                continue
+
+            connection.execute_sql(
+                """
+                INSERT INTO tblCategoryKeywordRule (Pattern, MatchType, CategoryID, Priority)
+                SELECT ?, 'substring', cat.CategoryID, ?
+                FROM tblCategory cat
+                WHERE cat.Name = ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM tblCategoryKeywordRule r
+                      WHERE r.CategoryID = cat.CategoryID
+                        AND r.Pattern = ?
+                        AND r.MatchType = 'substring'
+                  )
+                """,
+                (pattern, (position + 1) * 10, rule_category, pattern),
+            )
+            added += connection._cursor.rowcount
+
+        if added:
+            self._bump_data_version(connection, self.KEYWORD_RULES_VERSION)
+        return added
+
+    def _ensure_indexes_and_triggers(self):
+        self.create_indexes_if_not_exist()
+
+        # Triggers are (re)created here rather than with the table because rebuilding
+        # tblTransaction above drops any triggers attached to it.
+        connection = ConnectionWrapper(self.pool)
+        try:
+            connection.execute_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+            )
+            existing = {r[0] for r in connection.get_results()}
+        finally:
+            connection.wrap_it_up()
+
+        missing = [t for t in self.ROLLUP_TRIGGERS if t[0] not in existing]
+        if missing:
+            with self.transaction():
+                connection = ConnectionWrapper(self.pool)
+                try:
+                    for name, trigger_sql in missing:
+                        connection.execute_sql(trigger_sql)
+                        print("Created trigger " + name)
+                finally:
+                    connection.wrap_it_up()
+                # Totals may be stale if writes happened while a trigger was missing
+                self.rebuild_category_month_totals()
+
+        missing = [t for t in self.SEARCH_TRIGGERS if t[0] not in existing]
+        if missing:
+            with self.transaction():
+                connection = ConnectionWrapper(self.pool)
+                try:
+                    for name, trigger_sql in missing:
+                        connection.execute_sql(trigger_sql)
+                        print("Created trigger " + name)
+                finally:
+                    connection.wrap_it_up()
+                self.rebuild_transaction_search()
+
+        missing = [t for t in self.COUNTER_TRIGGERS if t[0] not in existing]
+        if missing:
+            with self.transaction():
+                connection = ConnectionWrapper(self.pool)
+                try:
+                    for name, trigger_sql in missing:
+                        connection.execute_sql(trigger_sql)
+                        print("Created trigger " + name)
+                finally:
+                    connection.wrap_it_up()
+                self.rebuild_counters()
+
+    def rebuild_category_month_totals(self):
+        """Recompute tblCategoryMonthTotal from tblTransaction; returns the number of rows."""
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql("DELETE FROM tblCategoryMonthTotal;")
+                connection.execute_sql("""
+                    INSERT INTO tblCategoryMonthTotal
+                        (MonthKey, CategoryID, NetSum, DebitSum, CreditSum, TxCount)
+                    SELECT
+                        strftime('%Y-%m', TxDateTimestamp, 'unixepoch', 'localtime'),
+                        TxCategoryID,
+                        SUM(TxDenomination),
+                        SUM(MIN(TxDenomination, 0)),
+                        SUM(MAX(TxDenomination, 0)),
+                        COUNT(*)
+                    FROM tblTransaction
+                    WHERE TxCategoryID IS NOT NULL AND DateDeleted IS NULL
+                    GROUP BY 1, 2;
+                """)
+                connection.execute_sql("SELECT COUNT(*) FROM tblCategoryMonthTotal")
+                count = connection.get_results()[0][0]
+            finally:
+                connection.wrap_it_up()
+
+        print("Rebuilt tblCategoryMonthTotal: %d rows" % count)
+        return count
+
+    def rebuild_transaction_search(self):
+        """Repopulate tblTransactionSearch from live transactions; returns the number of rows."""
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql("DELETE FROM tblTransactionSearch;")
+                connection.execute_sql("""
+                    INSERT INTO tblTransactionSearch
+                        (rowid, TxMemoRaw, TxCustomMemo, CategoryName, SourceBankName)
+                    SELECT
+                        tx.TxID,
+                        COALESCE(tx.TxMemoRaw, ''),
+                        COALESCE(tx.TxCustomMemo, ''),
+                        COALESCE(cat.Name, ''),
+                        COALESCE(sb.Name, '')
+                    FROM tblTransaction tx
+                    LEFT JOIN tblCategory cat ON cat.CategoryID = tx.TxCategoryID
+                    LEFT JOIN tblInputFile inputFile ON inputFile.InputFileID = tx.InputFileID
+                    LEFT JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
+                    WHERE tx.DateDeleted IS NULL;
+                """)
+                connection.execute_sql(
+                    "INSERT INTO tblTransactionSearch (tblTransactionSearch) VALUES ('optimize');"
+                )
+                connection.execute_sql("SELECT COUNT(*) FROM tblTransactionSearch")
+                count = connection.get_results()[0][0]
+            finally:
+                connection.wrap_it_up()
+
+        print("Rebuilt tblTransactionSearch: %d rows" % count)
+        return count
+
+    def rebuild_counters(self):
+        """Recount every tblCounter value from tblTransaction; returns the uncategorized count."""
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    """
+                    INSERT INTO tblCounter (Name, Value)
+                    SELECT ?, COUNT(*) FROM tblTransaction
+                    WHERE TxCategoryID IS NULL AND DateDeleted IS NULL
+                    ON CONFLICT(Name) DO UPDATE SET Value = excluded.Value;
+                    """,
+                    (self.UNCATEGORIZED_COUNTER,),
+                )
+                connection.execute_sql(
+                    "SELECT Value FROM tblCounter WHERE Name = ?",
+                    (self.UNCATEGORIZED_COUNTER,),
+                )
+                count = connection.get_results()[0][0]
+            finally:
+                connection.wrap_it_up()
+
+        print("Rebuilt tblCounter: %d uncategorized" % count)
+        return count
+
+    def create_indexes_if_not_exist(self):
+        connection = ConnectionWrapper(self.pool)
+        try:
+            connection.execute_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+            existing = {r[0] for r in connection.get_results()}
+            for name, index_sql in self.INDEXES:
+                if name not in existing:
+                    connection.execute_sql(index_sql)
+                    print("Created index " + name)
+            for name in self.OBSOLETE_INDEXES:
+                if name in existing:
+                    connection.execute_sql("DROP INDEX IF EXISTS " + name)
+                    print("Dropped index " + name)
+        finally:
+            connection.wrap_it_up()
+
+    def explain_query_plan(self, sql, params=()):
+        """Return the detail lines of EXPLAIN QUERY PLAN for a statement."""
+        connection = ConnectionWrapper(self.pool)
+        try:
+            connection.execute_sql("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[3] for row in connection.get_results()]
+        finally:
+            connection.wrap_it_up()
+
+    def check_query_plans(self):
+        """Return {query name: (expected index, plan lines, uses index)} for every hot query."""
+        ts_start = get_timestamp_for_datekey("2000-01")
+        ts_end = get_timestamp_for_datekey("2000-02")
+        hot_queries = {
+            "get_data_for_time_slice": self._time_slice_query(ts_start, ts_end),
+            "get_category_month_totals": self._category_month_totals_query("2000-01", "2000-02"),
+            "get_category_tx_sum_for_month": self._category_month_total_sum_query("2000-01", "2000-02"),
+            "get_category_6mo_avg_monthly_spend": self._category_month_total_sum_query("1999-08", "2000-02"),
+            "get_uncategorized_transactions": self._uncategorized_query(),
+            "get_uncategorized_transactions_count": self._uncategorized_count_query(),
+            "get_next_uncategorized_group": self._uncategorized_group_query(0),
+            "get_match_strings_with_tx_counts": self._match_strings_with_tx_counts_query(),
+        }
+
+        report = {}
+        for name, (sql, params) in hot_queries.items():
+            alias, index_name = self.HOT_QUERY_INDEXES[name]
+            plan = self.explain_query_plan(sql, params)
+            uses_index = any(
+                line.startswith("SEARCH %s " % alias) and index_name in line
+                for line in plan
+            )
+            report[name] = (index_name, plan, uses_index)
+        return report
+
+    def _backfill_dedupe_keys(self):
+        """Fill TxDedupeKey for rows that predate it.
+
+        Live rows that collide with an older live row under the normalized key are
+        left NULL so the unique index can still be built; they are logged, not deleted.
+        """
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql("""
+                    SELECT TxID, TxDenomination, TxDateHuman, TxMemoRaw, SourceBankID, DateDeleted
+                    FROM tblTransaction
+                    WHERE TxDedupeKey IS NULL
+                    ORDER BY TxID ASC
+                """)
+                rows = connection.get_results()
+                if not rows:
+                    return
+
+                connection.execute_sql("""
+                    SELECT TxDedupeKey FROM tblTransaction
+                    WHERE TxDedupeKey IS NOT NULL AND DateDeleted IS NULL
+                """)
+                live_keys = {r[0] for r in connection.get_results()}
+
+                updates = []
+                collisions = 0
+                for tx_id, denomination, date_human, memo_raw, source_bank_id, date_deleted in rows:
+                    key = get_dedupe_key(denomination, date_human, memo_raw, source_bank_id)
+                    if date_deleted is None:
+                        if key in live_keys:
+                            collisions += 1
+                            continue
+                        live_keys.add(key)
+                    updates.append((key, tx_id))
+
+                connection.execute_many(
+                    "UPDATE tblTransaction SET TxDedupeKey = ? WHERE TxID = ?", updates
+                )
+            finally:
+                connection.wrap_it_up()
+
+        print("Migrated tblTransaction.TxDedupeKey backfilled for %d rows" % len(updates))
+        if collisions:
+            logging.warning(
+                "%d live transactions duplicate an older row under the dedupe key; left without a key"
+                % collisions
+            )
+
+    def _backfill_normalized_memos(self):
+        """Fill TxMemoNormalized and MatchStringNormalized for rows that predate them."""
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql("""
+                    SELECT TxID, TxMemoRaw FROM tblTransaction
+                    WHERE TxMemoNormalized IS NULL AND TxMemoRaw IS NOT NULL
+                """)
+                tx_updates = [
+                    (normalize_memo(memo_raw), tx_id)
+                    for tx_id, memo_raw in connection.get_results()
+                ]
+
+                connection.execute_sql("""
+                    SELECT MatchID, MatchString FROM tblCategoryMatchString
+                    WHERE MatchStringNormalized IS NULL AND MatchString IS NOT NULL
+                """)
+                match_updates = [
+                    (normalize_memo(match_string), match_id)
+                    for match_id, match_string in connection.get_results()
+                ]
+
+                if not tx_updates and not match_updates:
+                    return
+
+                connection.execute_many(
+                    "UPDATE tblTransaction SET TxMemoNormalized = ? WHERE TxID = ?",
+                    tx_updates,
+                )
+                connection.execute_many(
+                    "UPDATE tblCategoryMatchString SET MatchStringNormalized = ? WHERE MatchID = ?",
+                    match_updates,
+                )
+            finally:
+                connection.wrap_it_up()
+
+        print(
+            "Migrated normalized memos backfilled for %d transactions and %d match strings"
+            % (len(tx_updates), len(match_updates))
+        )
+
+    def _backfill_merchant_ids(self):
+        """Intern the memos of transactions that predate tblMerchant and point them at it."""
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql("""
+                    INSERT OR IGNORE INTO tblMerchant (MemoRaw, MemoNormalized)
+                    SELECT TxMemoRaw, MIN(TxMemoNormalized)
+                    FROM tblTransaction
+                    WHERE MerchantID IS NULL AND TxMemoRaw IS NOT NULL
+                    GROUP BY TxMemoRaw
+                """)
+                merchants = connection._cursor.rowcount
+                connection.execute_sql("""
+                    UPDATE tblTransaction SET MerchantID = (
+                        SELECT MerchantID FROM tblMerchant
+                        WHERE tblMerchant.MemoRaw = tblTransaction.TxMemoRaw
+                    )
+                    WHERE MerchantID IS NULL AND TxMemoRaw IS NOT NULL
+                """)
+                transactions = connection._cursor.rowcount
+            finally:
+                connection.wrap_it_up()
+
+        if transactions:
+            print(
+                "Migrated tblTransaction.MerchantID backfilled for %d rows (%d new merchants)"
+                % (transactions, merchants)
+            )
+
+    def _get_merchant_ids(self, connection, memos):
+        """Map each raw memo to its MerchantID, adding tblMerchant rows for new ones.
+
+        Must run inside a transaction.  IDs come from the in-memory cache where
+        possible.  IDs looked up here only join the cache once the transaction
+        commits: a rolled-back ingest takes its new merchants with it, and SQLite
+        hands their IDs to whichever merchants are inserted next.  The cache is
+        also thrown away if tblMerchant has shrunk under it (e.g. a restored backup).
+        """
+        connection.execute_sql("SELECT COALESCE(MAX(MerchantID), 0) FROM tblMerchant")
+        high_water = connection.get_results()[0][0]
+
+        with self._merchant_ids_lock:
+            if any(merchant_id > high_water for merchant_id in self._merchant_ids.values()):
+                self._merchant_ids.clear()
+
+            ids = {}
+            missing = []
+            for memo in memos:
+                merchant_id = self._merchant_ids.get(memo)
+                if merchant_id is None:
+                    missing.append(memo)
+                else:
+                    ids[memo] = merchant_id
+
+        if missing:
+            missing = list(dict.fromkeys(missing))
+            connection.execute_many(
+                "INSERT OR IGNORE INTO tblMerchant (MemoRaw, MemoNormalized) VALUES (?, ?)",
+                [(memo, normalize_memo(memo)) for memo in missing],
+            )
+            found = {}
+            for start in range(0, len(missing), self.INSERT_CHUNK_SIZE):
+                chunk = missing[start : start + self.INSERT_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                connection.execute_sql(
+                    f"SELECT MemoRaw, MerchantID FROM tblMerchant WHERE MemoRaw IN ({placeholders})",
+                    chunk,
+                )
+                found.update(connection.get_results())
+            ids.update(found)
+            self.pool.after_commit(lambda: self._remember_merchant_ids(found))
+
+        return ids
+
+    def _remember_merchant_ids(self, merchant_ids):
+        with self._merchant_ids_lock:
+            self._merchant_ids.update(merchant_ids)
+
     def _get_table_creation_sql(self, table_name):
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection._cursor.execute(
                 "SELECT sql FROM sqlite_master WHERE type='table' AND name=?",
@@ -285,7 +1466,7 @@ class SqliteClient:
 
     def _migrate_tbltransaction_unique_per_source(self):
         """Recreate tblTransaction with UNIQUE(..., SourceBankID) so one row per (denom, date, memo, source)."""
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql("""
                 CREATE TABLE tblTransaction_new (
@@ -336,13 +1517,13 @@ class SqliteClient:
         print("Migrated tblTransaction: unique per (denom, date, memo, source) across files")
 
     def get_columns_for_table(self, table_name):
-        sql = f"""
-        PRAGMA table_info({table_name});
+        sql = """
+        SELECT cid, name FROM pragma_table_info(?);
         """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (table_name,))
             results = connection.get_results()
 
             if not results:
@@ -357,15 +1538,15 @@ class SqliteClient:
             connection.wrap_it_up()
 
     def get_category_id(self, category_name):
-        sql = f"""
+        sql = """
         SELECT CategoryID
         FROM tblCategory 
-        WHERE Name = '{category_name}'
+        WHERE Name = ?
         """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (category_name,))
             results = connection.get_results()
 
             if not results:
@@ -375,53 +1556,57 @@ class SqliteClient:
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def insert_category(self, category_name):
         category_name = category_name.lower()
 
-        sql = f"""
-        INSERT OR IGNORE INTO tblCategory (Name) VALUES ('{category_name}');
+        sql = """
+        INSERT OR IGNORE INTO tblCategory (Name) VALUES (?);
         """
 
-        connection = ConnectionWrapper(self.database_name)
-        try:
-            connection.execute_sql(sql)
-        finally:
-            connection.wrap_it_up()
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(sql, (category_name,))
+                if connection._cursor.rowcount:
+                    # A new category picks up any default keyword rules naming it
+                    self._seed_default_keyword_rules(connection, category_name)
+            finally:
+                connection.wrap_it_up()
 
+    @serialized_write
     def insert_input_file(
         self, source_bank_id, date_created_timestamp, human_date_created, file_name
     ):
-        sql = f"""
+        sql = """
         INSERT OR IGNORE INTO tblInputFile (
             SourceBankID,
             DateCreatedTimestamp,
             DateCreatedHuman,
             FileName
-        ) VALUES (
-            {source_bank_id},
-            {date_created_timestamp},
-            '{human_date_created}',
-            '{file_name}'
-        )
+        ) VALUES (?, ?, ?, ?)
         """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(
+                sql,
+                (source_bank_id, date_created_timestamp, human_date_created, file_name),
+            )
         finally:
             connection.wrap_it_up()
 
     def get_input_file_id(self, source_bank_id, file_name):
-        sql = f"""
+        sql = """
         SELECT InputFileID, DateProcessedSuccessfullyTimestamp
         FROM tblInputFile 
-        WHERE SourceBankID = {source_bank_id}
-          AND FileName = '{file_name}'
+        WHERE SourceBankID = ?
+          AND FileName = ?
         """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (source_bank_id, file_name))
             results = connection.get_results()
 
             if not results:
@@ -433,12 +1618,13 @@ class SqliteClient:
 
     def get_source_bank_id_for_file(self, file_id):
         """Return SourceBankID for the given InputFileID, or None."""
-        sql = f"""
-        SELECT SourceBankID FROM tblInputFile WHERE InputFileID = {int(file_id)}
+        sql = """
+        SELECT SourceBankID FROM tblInputFile WHERE InputFileID = ?
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (int(file_id),))
+
             results = connection.get_results()
             return results[0][0] if results else None
         finally:
@@ -448,22 +1634,16 @@ class SqliteClient:
         self, denomination, date_human, date_timestamp, memo_raw, source_bank_id
     ):
         """True if a non-deleted transaction with this (denom, date, memo) already exists for this source (any file)."""
-        safe_memo = memo_raw.replace("'", "''")
-        safe_date = date_human.replace("'", "''")
-        sql = f"""
-        SELECT 1 FROM tblTransaction tx
-        INNER JOIN tblInputFile f ON tx.InputFileID = f.InputFileID
-        WHERE f.SourceBankID = {int(source_bank_id)}
-          AND tx.TxDenomination = {denomination}
-          AND tx.TxDateHuman = '{safe_date}'
-          AND tx.TxDateTimestamp = {int(date_timestamp)}
-          AND tx.TxMemoRaw = '{safe_memo}'
-          AND tx.DateDeleted IS NULL
-        LIMIT 1
-        """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(
+                """
+                SELECT 1 FROM tblTransaction
+                WHERE TxDedupeKey = ? AND DateDeleted IS NULL
+                LIMIT 1
+                """,
+                (get_dedupe_key(denomination, date_human, memo_raw, source_bank_id),),
+            )
             return len(connection.get_results()) > 0
         finally:
             connection.wrap_it_up()
@@ -471,75 +1651,185 @@ class SqliteClient:
     def insert_transaction(
         self, denomination, date_human, date_timestamp, memo_raw, file_id
     ):
-        memo_raw = memo_raw.replace("'", "")
+        self.insert_transactions(
+            [(denomination, date_human, date_timestamp, memo_raw)], file_id
+        )
 
+    @serialized_write
+    def insert_transactions(self, rows, file_id):
+        """Insert (denomination, date_human, date_timestamp, memo_raw) rows for a file.
+
+        Rows are consumed lazily in chunks; rows already on file for the same source
+        (or repeated within the input) are skipped.  Everything is written in a single
+        transaction.  Returns the number of rows inserted.
+        """
         source_bank_id = self.get_source_bank_id_for_file(file_id)
         if source_bank_id is None:
-            return
-        if self.transaction_exists_for_source(
-            denomination, date_human, date_timestamp, memo_raw, source_bank_id
-        ):
-            return
+            return 0
 
-        date_safe = date_human.replace("'", "''")
-        sql = f"""
-        INSERT OR IGNORE INTO tblTransaction(
+        insert_sql = """
+        INSERT INTO tblTransaction(
             TxDenomination,
             TxDateHuman,
             TxDateTimestamp,
             TxMemoRaw,
             TxCategoryID,
             InputFileID,
-            SourceBankID
-        ) VALUES (
-            {denomination},
-            '{date_safe}',
-            {date_timestamp},
-            '{memo_raw.replace("'", "''")}',
-            NULL,
-            {file_id},
-            {source_bank_id}
-        );
+            SourceBankID,
+            TxDedupeKey,
+            TxMemoNormalized,
+            MerchantID
+        ) VALUES (?, ?, ?, ?, NULL, ?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING;
+        """
+
+        inserted = 0
+        seen = set()
+        rows = iter(rows)
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                while True:
+                    chunk = list(itertools.islice(rows, self.INSERT_CHUNK_SIZE))
+                    if not chunk:
+                        break
+
+                    new_rows = []
+                    for denomination, date_human, date_timestamp, memo_raw in chunk:
+                        key = get_dedupe_key(
+                            denomination, date_human, memo_raw, source_bank_id
+                        )
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        new_rows.append(
+                            (
+                                float(denomination),
+                                date_human,
+                                int(date_timestamp),
+                                memo_raw,
+                                int(file_id),
+                                source_bank_id,
+                                key,
+                                normalize_memo(memo_raw),
+                            )
+                        )
+
+                    existing = self._get_existing_dedupe_keys(
+                        connection, [r[6] for r in new_rows]
+                    )
+                    new_rows = [r for r in new_rows if r[6] not in existing]
+                    if new_rows:
+                        merchant_ids = self._get_merchant_ids(
+                            connection, [r[3] for r in new_rows]
+                        )
+                        new_rows = [r + (merchant_ids[r[3]],) for r in new_rows]
+                        connection.execute_many(insert_sql, new_rows)
+                        inserted += connection._cursor.rowcount
+            finally:
+                connection.wrap_it_up()
+
+        return inserted
+
+    def _get_existing_dedupe_keys(self, connection, keys):
+        """Subset of keys that already belong to a live transaction."""
+        if not keys:
+            return set()
+
+        placeholders = ",".join("?" * len(keys))
+        connection.execute_sql(
+            f"""
+            SELECT TxDedupeKey FROM tblTransaction
+            WHERE TxDedupeKey IN ({placeholders})
+              AND DateDeleted IS NULL
+            """,
+            keys,
+        )
+        return {row[0] for row in connection.get_results()}
+
+    def get_uncategorized_transactions_for_file(self, file_id):
+        """(TxID, TxDenomination, TxMemoRaw, SourceBankName) for a file's live, uncategorized rows."""
+        connection = ConnectionWrapper(self.pool)
+        try:
+            connection.execute_sql(
+                """
+                SELECT tx.TxID, tx.TxDenomination, tx.TxMemoRaw, COALESCE(sb.Name, '')
+                FROM tblTransaction tx
+                LEFT JOIN tblSourceBank sb ON sb.SourceBankID = tx.SourceBankID
+                WHERE tx.InputFileID = ?
+                  AND tx.TxCategoryID IS NULL
+                  AND tx.DateDeleted IS NULL
+                ORDER BY tx.TxID ASC
+                """,
+                (int(file_id),),
+            )
+            return connection.get_results()
+        finally:
+            connection.wrap_it_up()
+
+    @serialized_write
+    def apply_rule_categories(self, rows):
+        """Categorize transactions from (category_id, match_id, keyword_rule_id, tx_id) rows.
+
+        Records which rule fired alongside the category.  Rows that were categorized
+        in the meantime are left alone.  Returns the number of transactions updated.
         """
+        rows = list(rows)
+        if not rows:
+            return 0
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_many(
+                """
+                UPDATE tblTransaction
+                SET TxCategoryID = ?, TxCategoryMatchID = ?, TxCategoryKeywordRuleID = ?
+                WHERE TxID = ? AND TxCategoryID IS NULL
+                """,
+                rows,
+            )
+            return connection._cursor.rowcount
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def set_processed_success_date(self, file_id):
         now_timestamp = TimeObserver.get_timestamp_from_date_string(
             TimeObserver.get_now_date_string()
         )
 
-        sql = f"""
+        sql = """
             UPDATE tblInputFile
-            SET DateProcessedSuccessfullyTimestamp = {now_timestamp}
-            WHERE InputFileID = {file_id}
+            SET DateProcessedSuccessfullyTimestamp = ?
+            WHERE InputFileID = ?
             """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (now_timestamp, int(file_id)))
         finally:
             connection.wrap_it_up()
 
-    def get_uncategorized_transactions_count(self):
+    def _uncategorized_count_query(self):
+        # Maintained by COUNTER_TRIGGERS
         sql = """
-        SELECT COUNT(*)
-        FROM tblTransaction tx
-        WHERE TxCategoryID IS NULL AND tx.DateDeleted IS NULL
+        SELECT Value
+        FROM tblCounter c
+        WHERE Name = ?
         """
-        connection = ConnectionWrapper(self.database_name)
+        return sql, (self.UNCATEGORIZED_COUNTER,)
+
+    def get_uncategorized_transactions_count(self):
+        sql, params = self._uncategorized_count_query()
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, params)
             result = connection.get_results()
             return result[0][0] if result else 0
         finally:
             connection.wrap_it_up()
 
-    def get_uncategorized_transactions(self):
+    def _uncategorized_query(self):
         sql = """
         SELECT TxID, TxDenomination, TxMemoRaw, TxCustomMemo, TxDateHuman, sb.Name
         FROM tblTransaction tx
@@ -548,26 +1838,82 @@ class SqliteClient:
         WHERE TxCategoryID IS NULL AND tx.DateDeleted IS NULL
         ORDER BY TxDateTimestamp ASC
         """
+        return sql, ()
 
-        connection = ConnectionWrapper(self.database_name)
+    def get_uncategorized_transactions(self):
+        sql, params = self._uncategorized_query()
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, params)
             return connection.get_results()
         finally:
             connection.wrap_it_up()
 
+    def _next_uncategorized_memo_query(self):
+        sql = """
+        SELECT TxMemoRaw, MerchantID
+        FROM tblTransaction tx
+        INNER JOIN tblInputFile inputFile ON inputFile.InputFileID = tx.InputFileID
+        INNER JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
+        WHERE TxCategoryID IS NULL AND tx.DateDeleted IS NULL
+        ORDER BY TxDateTimestamp ASC, TxID ASC
+        LIMIT 1
+        """
+        return sql, ()
+
+    def _uncategorized_group_query(self, merchant_id):
+        sql = """
+        SELECT TxID, TxDenomination, TxMemoRaw, TxCustomMemo, TxDateHuman, sb.Name
+        FROM tblTransaction tx
+        INNER JOIN tblInputFile inputFile ON inputFile.InputFileID = tx.InputFileID
+        INNER JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
+        WHERE TxCategoryID IS NULL AND MerchantID = ? AND tx.DateDeleted IS NULL
+        ORDER BY TxDateTimestamp ASC, TxID ASC
+        """
+        return sql, (merchant_id,)
+
+    def get_next_uncategorized_group(self):
+        """Return the oldest uncategorized transaction's memo group.
+
+        The result is (memo_raw, rows, total_remaining): rows share the raw memo
+        and have the same shape as get_uncategorized_transactions(), and
+        total_remaining counts every uncategorized transaction.  memo_raw is None
+        and rows is empty when nothing is left.
+        """
+        connection = ConnectionWrapper(self.pool)
+        try:
+            sql, params = self._next_uncategorized_memo_query()
+            connection.execute_sql(sql, params)
+            results = connection.get_results()
+            if not results:
+                return None, [], 0
+            memo_raw, merchant_id = results[0]
+
+            sql, params = self._uncategorized_group_query(merchant_id)
+            connection.execute_sql(sql, params)
+            rows = connection.get_results()
+
+            sql, params = self._uncategorized_count_query()
+            connection.execute_sql(sql, params)
+            total_remaining = connection.get_results()[0][0]
+
+            return memo_raw, rows, total_remaining
+        finally:
+            connection.wrap_it_up()
+
     def get_transaction(self, tx_id):
-        sql = f"""
+        sql = """
         SELECT TxID, TxDenomination, TxMemoRaw, TxCustomMemo, TxDateHuman, sb.Name
         FROM tblTransaction tx
         INNER JOIN tblInputFile inputFile ON inputFile.InputFileID = tx.InputFileID
         INNER JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
-        WHERE TxID = {int(tx_id)}
+        WHERE TxID = ?
         """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (int(tx_id),))
+
             results = connection.get_results()
             if results:
                 r = results[0]
@@ -589,57 +1935,97 @@ class SqliteClient:
             connection.wrap_it_up()
 
     def get_memos_to_categories(self):
-        sql = f"""
-        SELECT cms.CategoryID, cat.Name AS CategoryName, MatchString
+        sql = """
+        SELECT cms.CategoryID, cat.Name AS CategoryName, MatchString, cms.MatchID
         FROM tblCategoryMatchString cms
         INNER JOIN tblCategory cat ON cms.CategoryID = cat.CategoryID
         """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(sql)
             return connection.get_results()
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def insert_memo_to_category(self, memo, category_id):
-        sql = f"""
-        INSERT OR IGNORE INTO tblCategoryMatchString (CategoryID, MatchString) VALUES ({int(category_id)}, '{memo}');
+        sql = """
+        INSERT OR IGNORE INTO tblCategoryMatchString (CategoryID, MatchString, MatchStringNormalized)
+        VALUES (?, ?, ?);
         """
-        connection = ConnectionWrapper(self.database_name)
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    sql, (int(category_id), memo, normalize_memo(memo))
+                )
+                self._bump_data_version(connection, self.MATCH_STRINGS_VERSION)
+            finally:
+                connection.wrap_it_up()
+
+    def get_data_version(self, name):
+        """Current value of a tblDataVersion counter (0 if it has never been bumped)."""
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(
+                "SELECT Version FROM tblDataVersion WHERE Name = ?", (name,)
+            )
+            results = connection.get_results()
+            return results[0][0] if results else 0
         finally:
             connection.wrap_it_up()
 
+    def _bump_data_version(self, connection, name):
+        connection.execute_sql(
+            """
+            INSERT INTO tblDataVersion (Name, Version) VALUES (?, 1)
+            ON CONFLICT(Name) DO UPDATE SET Version = Version + 1
+            """,
+            (name,),
+        )
+
+    def _bump_global_data_version(self, connection):
+        # Runs on the raw sqlite3 connection from ConnectionPool.commit(), as part of
+        # the transaction being committed
+        connection.execute(
+            """
+            INSERT INTO tblDataVersion (Name, Version) VALUES (?, 1)
+            ON CONFLICT(Name) DO UPDATE SET Version = Version + 1
+            """,
+            (self.DATA_VERSION,),
+        )
+
     def get_categories(self, filter=""):
-        sql = f"""
+        sql = """
         SELECT CategoryID, Name 
         FROM tblCategory
         """
+        params = ()
 
         if filter:
-            sql = sql + f"WHERE Name = '{filter}'"
+            sql = sql + "WHERE Name = ?"
+            params = (filter,)
 
         sql = sql + " ORDER BY Name ASC "
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, params)
             return connection.get_results()
         finally:
             connection.wrap_it_up()
 
     def get_category_by_id(self, id):
-        sql = f"""
+        sql = """
                 SELECT Name 
                 FROM tblCategory
-                WHERE CategoryID = {id}
+                WHERE CategoryID = ?
                 """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (id,))
             return connection.get_results()[0][0]
         finally:
             connection.wrap_it_up()
@@ -652,7 +2038,7 @@ class SqliteClient:
         INNER JOIN tblCategory cat ON cat.CategoryID = cec.CategoryID
         ORDER BY cat.Name ASC
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(sql)
             return [r[0] for r in connection.get_results()]
@@ -667,78 +2053,115 @@ class SqliteClient:
         INNER JOIN tblCategory cat ON cat.CategoryID = cec.CategoryID
         ORDER BY cat.Name ASC
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(sql)
             return connection.get_results()
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def add_core_expense_category(self, category_id):
         """Mark a category as a core expense."""
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(
-                f"INSERT OR IGNORE INTO tblCoreExpenseCategory (CategoryID) VALUES ({int(category_id)});"
+                "INSERT OR IGNORE INTO tblCoreExpenseCategory (CategoryID) VALUES (?);",
+                (int(category_id),),
             )
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def remove_core_expense_category(self, category_id):
         """Remove a category from core expenses."""
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(
-                f"DELETE FROM tblCoreExpenseCategory WHERE CategoryID = {int(category_id)};"
+                "DELETE FROM tblCoreExpenseCategory WHERE CategoryID = ?;",
+                (int(category_id),),
             )
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def set_category_id_for_tx(self, tx_id, category_id):
-        sql = f"""
+        sql = """
         UPDATE tblTransaction
-        SET TxCategoryID = {category_id}
-        WHERE TxID = {tx_id}
+        SET TxCategoryID = ?,
+            TxCategoryMatchID = NULL,
+            TxCategoryKeywordRuleID = NULL
+        WHERE TxID = ?
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (int(category_id), int(tx_id)))
+
         finally:
             connection.wrap_it_up()
 
     def search_transactions(self, memo_query="", category_filter="", limit=200):
-        """Return transactions with optional memo substring filter and category filter.
-        Results are returned ordered by date desc; fuzzy ranking is done in the caller."""
-        conditions = ["tx.DateDeleted IS NULL"]
+        """Return transactions matching a search-as-you-type memo query and/or a category.
+
+        Every word of memo_query is matched as a prefix against the full-text index, and
+        results are ranked by bm25 over the whole corpus.  Without a query, the most
+        recent transactions are returned, newest first.
+        """
+        params = []
         if memo_query:
-            safe = memo_query.replace("'", "''")
-            conditions.append(f"LOWER(tx.TxMemoRaw) LIKE LOWER('%{safe}%')")
-        if category_filter:
-            safe_cat = category_filter.replace("'", "''")
-            conditions.append(f"LOWER(cat.Name) = LOWER('{safe_cat}')")
+            match = self._search_match_expression(memo_query)
+            if not match:
+                return []
 
-        where = " AND ".join(conditions)
+            sql = """
+            SELECT
+                tx.TxID,
+                tx.TxDenomination,
+                tx.TxDateHuman,
+                tx.TxMemoRaw,
+                tx.TxCustomMemo,
+                tblTransactionSearch.CategoryName,
+                tblTransactionSearch.SourceBankName
+            FROM tblTransactionSearch
+            INNER JOIN tblTransaction tx ON tx.TxID = tblTransactionSearch.rowid
+            WHERE tblTransactionSearch MATCH ?
+            """
+            params.append(match)
+            if category_filter:
+                sql += " AND tblTransactionSearch.CategoryName = ? COLLATE NOCASE"
+                params.append(category_filter)
+            sql += """
+            ORDER BY bm25(tblTransactionSearch), tx.TxDateTimestamp DESC
+            LIMIT ?
+            """
+        else:
+            sql = """
+            SELECT
+                tx.TxID,
+                tx.TxDenomination,
+                tx.TxDateHuman,
+                tx.TxMemoRaw,
+                tx.TxCustomMemo,
+                COALESCE(cat.Name, '') AS CategoryName,
+                COALESCE(sb.Name, '') AS SourceBankName
+            FROM tblTransaction tx
+            LEFT JOIN tblCategory cat ON cat.CategoryID = tx.TxCategoryID
+            LEFT JOIN tblInputFile inputFile ON inputFile.InputFileID = tx.InputFileID
+            LEFT JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
+            WHERE tx.DateDeleted IS NULL
+            """
+            if category_filter:
+                sql += " AND LOWER(cat.Name) = LOWER(?)"
+                params.append(category_filter)
+            sql += """
+            ORDER BY tx.TxDateTimestamp DESC
+            LIMIT ?
+            """
+        params.append(int(limit))
 
-        sql = f"""
-        SELECT
-            tx.TxID,
-            tx.TxDenomination,
-            tx.TxDateHuman,
-            tx.TxMemoRaw,
-            tx.TxCustomMemo,
-            COALESCE(cat.Name, '') AS CategoryName,
-            COALESCE(sb.Name, '') AS SourceBankName
-        FROM tblTransaction tx
-        LEFT JOIN tblCategory cat ON cat.CategoryID = tx.TxCategoryID
-        LEFT JOIN tblInputFile inputFile ON inputFile.InputFileID = tx.InputFileID
-        LEFT JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
-        WHERE {where}
-        ORDER BY tx.TxDateTimestamp DESC
-        LIMIT {int(limit)}
-        """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, params)
             results = connection.get_results()
             out = []
             for r in results:
@@ -758,27 +2181,42 @@ class SqliteClient:
         finally:
             connection.wrap_it_up()
 
-    def get_data_for_time_slice(self, date_start, date_end, category_filter=""):
-        sql = f"""
+    def _search_match_expression(self, memo_query):
+        # Quote each word so FTS5 operators typed by the user are searched literally,
+        # and make each one a prefix query so partially typed words still match.
+        # Only the memo columns are searched; category and source are there for display.
+        words = re.findall(r"\w+", memo_query.lower())
+        if not words:
+            return ""
+        return "{TxMemoRaw TxCustomMemo} : (%s)" % " ".join('"%s"*' % word for word in words)
+
+    def _time_slice_query(self, date_start, date_end, category_filter=""):
+        sql = """
         SELECT cat.Name, TxDenomination, TxDateTimestamp, TxMemoRaw, TxCustomMemo, TxID, sb.Name AS SourceBankName
         FROM tblTransaction tx
         INNER JOIN tblCategory cat ON tx.TxCategoryID = cat.CategoryID
         INNER JOIN tblInputFile inputFile ON inputFile.InputFileID = tx.InputFileID
         LEFT JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
         WHERE cat.Name NOT IN ('transfer', 'credit card payment')
-          AND TxDateTimestamp >= {date_start}
-          AND TxDateTimestamp < {date_end}
+          AND TxDateTimestamp >= ?
+          AND TxDateTimestamp < ?
           AND DateDeleted IS NULL
         """
+        params = [int(date_start), int(date_end)]
 
         if category_filter != "":
-            sql = sql + f" AND cat.Name = '{category_filter}'"
+            sql = sql + " AND cat.Name = ?"
+            params.append(category_filter)
 
         sql = sql + " ORDER BY TxDateTimestamp ASC"
+        return sql, params
+
+    def get_data_for_time_slice(self, date_start, date_end, category_filter=""):
+        sql, params = self._time_slice_query(date_start, date_end, category_filter)
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, params)
             results = connection.get_results()
             out = []
             for a in results:
@@ -799,29 +2237,51 @@ class SqliteClient:
             connection.wrap_it_up()
 
     def update_category(self, tx_id, category_id):
-        cat_value = "NULL" if category_id is None or category_id == "" else str(int(category_id))
-        sql = f"""
-        UPDATE tblTransaction 
-        SET TxCategoryID = {cat_value}
-        WHERE TxID = {tx_id}
+        self.update_categories([(tx_id, category_id)])
+
+    @serialized_write
+    def update_categories(self, pairs):
+        """Set TxCategoryID for many (tx_id, category_id) pairs in one transaction.
+
+        A category_id of None or "" marks the transaction uncategorized.  Returns the
+        number of transactions updated.
         """
+        rows = [
+            (
+                None if category_id is None or category_id == "" else int(category_id),
+                int(tx_id),
+            )
+            for tx_id, category_id in pairs
+        ]
+        if not rows:
+            return 0
 
-        connection = ConnectionWrapper(self.database_name)
-        try:
-            connection.execute_sql(sql)
-        finally:
-            connection.wrap_it_up()
+        sql = """
+        UPDATE tblTransaction
+        SET TxCategoryID = ?,
+            TxCategoryMatchID = NULL,
+            TxCategoryKeywordRuleID = NULL
+        WHERE TxID = ?
+        """
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_many(sql, rows)
+                return connection._cursor.rowcount
+            finally:
+                connection.wrap_it_up()
 
+    @serialized_write
     def update_custom_memo(self, tx_id, custom_memo):
-        safe = (custom_memo or "").strip().replace("'", "''")
-        sql = f"""
+        custom_memo = (custom_memo or "").strip()
+        sql = """
         UPDATE tblTransaction
-        SET TxCustomMemo = {'NULL' if not safe else f"'{safe}'"}
-        WHERE TxID = {int(tx_id)}
+        SET TxCustomMemo = ?
+        WHERE TxID = ?
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (custom_memo or None, int(tx_id)))
         finally:
             connection.wrap_it_up()
 
@@ -835,7 +2295,7 @@ class SqliteClient:
         GROUP BY sourceBank.Name
         """
 
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(sql)
             results = connection.get_results()
@@ -861,7 +2321,7 @@ class SqliteClient:
         GROUP BY f.InputFileID, f.FileName, f.DateCreatedHuman, sb.Name
         ORDER BY f.DateCreatedTimestamp DESC
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(sql)
             results = connection.get_results()
@@ -882,7 +2342,7 @@ class SqliteClient:
             connection.wrap_it_up()
 
     def get_transactions_for_file(self, file_id):
-        sql = f"""
+        sql = """
         SELECT
             tx.TxID,
             tx.TxDenomination,
@@ -894,12 +2354,13 @@ class SqliteClient:
             tx.DateDeleted
         FROM tblTransaction tx
         LEFT JOIN tblCategory cat ON cat.CategoryID = tx.TxCategoryID
-        WHERE tx.InputFileID = {int(file_id)}
+        WHERE tx.InputFileID = ?
         ORDER BY tx.TxDateTimestamp ASC, tx.TxID ASC
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, (int(file_id),))
+
             results = connection.get_results()
             out = []
             for r in results:
@@ -921,37 +2382,54 @@ class SqliteClient:
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def add_match_rule_and_apply(self, match_string, category_id):
-        """Insert a new match rule and backfill all transactions whose memo matches."""
-        safe_memo = match_string.strip().replace("'", "''")
+        """Insert a new match rule and backfill all transactions whose memo matches.
 
-        insert_sql = f"""
-        INSERT OR IGNORE INTO tblCategoryMatchString (CategoryID, MatchString)
-        VALUES ({int(category_id)}, '{safe_memo}');
+        A transaction matches when its memo normalizes (normalize_memo) to the same
+        text as the match string.
         """
-        connection = ConnectionWrapper(self.database_name)
-        try:
-            connection.execute_sql(insert_sql)
-        finally:
-            connection.wrap_it_up()
+        match_string = match_string.strip()
+        normalized = normalize_memo(match_string)
+
+        insert_sql = """
+        INSERT OR IGNORE INTO tblCategoryMatchString (CategoryID, MatchString, MatchStringNormalized)
+        VALUES (?, ?, ?);
+        """
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    insert_sql, (int(category_id), match_string, normalized)
+                )
+                self._bump_data_version(connection, self.MATCH_STRINGS_VERSION)
+            finally:
+                connection.wrap_it_up()
 
-        backfill_sql = f"""
+        backfill_sql = """
         UPDATE tblTransaction
-        SET TxCategoryID = {int(category_id)}
-        WHERE LOWER(TxMemoRaw) = LOWER('{safe_memo}')
+        SET TxCategoryID = ?,
+            TxCategoryMatchID = (
+                SELECT MatchID FROM tblCategoryMatchString
+                WHERE CategoryID = ? AND MatchString = ?
+            ),
+            TxCategoryKeywordRuleID = NULL
+        WHERE TxMemoNormalized = ?
           AND DateDeleted IS NULL
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(backfill_sql)
+            connection.execute_sql(
+                backfill_sql,
+                (int(category_id), int(category_id), match_string, normalized),
+            )
             connection._cursor.execute("SELECT changes()")
             rows_affected = connection._cursor.fetchone()[0]
             return rows_affected
         finally:
             connection.wrap_it_up()
 
-    def get_match_strings_with_tx_counts(self):
-        """Return all category match strings with how many transactions currently carry that memo."""
+    def _match_strings_with_tx_counts_query(self):
         sql = """
         SELECT
             cms.MatchID,
@@ -962,14 +2440,19 @@ class SqliteClient:
         FROM tblCategoryMatchString cms
         INNER JOIN tblCategory cat ON cms.CategoryID = cat.CategoryID
         LEFT JOIN tblTransaction tx
-            ON LOWER(tx.TxMemoRaw) = LOWER(cms.MatchString)
+            ON tx.TxMemoNormalized = cms.MatchStringNormalized
            AND tx.DateDeleted IS NULL
         GROUP BY cms.MatchID, cms.MatchString, cms.CategoryID, cat.Name
         ORDER BY cat.Name ASC, cms.MatchString ASC
         """
-        connection = ConnectionWrapper(self.database_name)
+        return sql, ()
+
+    def get_match_strings_with_tx_counts(self):
+        """Return all category match strings with how many transactions currently carry that memo."""
+        sql, params = self._match_strings_with_tx_counts_query()
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, params)
             results = connection.get_results()
             return [
                 {
@@ -984,79 +2467,225 @@ class SqliteClient:
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def reassign_match_string(self, match_id, new_category_id):
         """Move a match string to a new category and backfill all matching transactions."""
-        get_sql = f"""
-        SELECT MatchString FROM tblCategoryMatchString WHERE MatchID = {int(match_id)}
+        get_sql = """
+        SELECT MatchStringNormalized FROM tblCategoryMatchString WHERE MatchID = ?
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(get_sql)
+            connection.execute_sql(get_sql, (int(match_id),))
             results = connection.get_results()
             if not results:
                 return 0
-            match_string = results[0][0]
+            normalized = results[0][0]
         finally:
             connection.wrap_it_up()
 
-        update_cms_sql = f"""
+        update_cms_sql = """
         UPDATE tblCategoryMatchString
-        SET CategoryID = {int(new_category_id)}
-        WHERE MatchID = {int(match_id)}
+        SET CategoryID = ?
+        WHERE MatchID = ?
         """
-        connection = ConnectionWrapper(self.database_name)
-        try:
-            connection.execute_sql(update_cms_sql)
-        finally:
-            connection.wrap_it_up()
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    update_cms_sql, (int(new_category_id), int(match_id))
+                )
+                self._bump_data_version(connection, self.MATCH_STRINGS_VERSION)
+            finally:
+                connection.wrap_it_up()
 
-        safe_memo = match_string.replace("'", "''")
-        update_tx_sql = f"""
+        update_tx_sql = """
         UPDATE tblTransaction
-        SET TxCategoryID = {int(new_category_id)}
-        WHERE LOWER(TxMemoRaw) = LOWER('{safe_memo}')
+        SET TxCategoryID = ?,
+            TxCategoryMatchID = ?,
+            TxCategoryKeywordRuleID = NULL
+        WHERE TxMemoNormalized = ?
           AND DateDeleted IS NULL
         """
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(update_tx_sql)
+            connection.execute_sql(
+                update_tx_sql, (int(new_category_id), int(match_id), normalized)
+            )
             connection._cursor.execute("SELECT changes()")
             rows_affected = connection._cursor.fetchone()[0]
             return rows_affected
         finally:
             connection.wrap_it_up()
 
-    def delete_transaction(self, tx_id):
-        sql = f"""
-                UPDATE tblTransaction 
-                SET DateDeleted = '{TimeObserver.get_now_date_string()}'
-                WHERE TxID = {tx_id};
-                """
-
-        connection = ConnectionWrapper(self.database_name)
+    def get_category_keyword_rules(self):
+        """Return every keyword rule, in the order they are evaluated (Priority, then RuleID)."""
+        sql = """
+        SELECT
+            r.RuleID,
+            r.Pattern,
+            r.MatchType,
+            r.CategoryID,
+            cat.Name AS CategoryName,
+            r.AmountMin,
+            r.AmountMax,
+            r.SourceBankID,
+            sb.Name AS SourceBankName,
+            r.Priority,
+            r.AutoApply
+        FROM tblCategoryKeywordRule r
+        INNER JOIN tblCategory cat ON cat.CategoryID = r.CategoryID
+        LEFT JOIN tblSourceBank sb ON sb.SourceBankID = r.SourceBankID
+        ORDER BY r.Priority ASC, r.RuleID ASC
+        """
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(sql)
+            results = connection.get_results()
+            return [
+                {
+                    "rule_id": r[0],
+                    "pattern": r[1],
+                    "match_type": r[2],
+                    "category_id": r[3],
+                    "category_name": r[4],
+                    "amount_min": r[5],
+                    "amount_max": r[6],
+                    "source_bank_id": r[7],
+                    "source_bank_name": r[8],
+                    "priority": r[9],
+                    "auto_apply": bool(r[10]),
+                }
+                for r in results
+            ]
         finally:
             connection.wrap_it_up()
 
-    def delete_file_and_transactions(self, file_id):
-        """Permanently delete all transactions for this file and the input file record."""
-        connection = ConnectionWrapper(self.database_name)
+    @serialized_write
+    def add_category_keyword_rule(
+        self,
+        pattern,
+        match_type,
+        category_id,
+        amount_min=None,
+        amount_max=None,
+        source_bank_id=None,
+        priority=None,
+        auto_apply=False,
+    ):
+        """Insert a keyword rule; without a priority it goes after every existing rule.
+
+        auto_apply marks a rule as confident enough to categorize transactions at import.
+        """
+        if match_type not in self.KEYWORD_RULE_MATCH_TYPES:
+            raise ValueError("Unknown keyword rule match type: %s" % match_type)
+
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                if priority is None:
+                    connection.execute_sql(
+                        "SELECT COALESCE(MAX(Priority), 0) + 10 FROM tblCategoryKeywordRule"
+                    )
+                    priority = connection.get_results()[0][0]
+
+                connection.execute_sql(
+                    """
+                    INSERT INTO tblCategoryKeywordRule
+                        (Pattern, MatchType, CategoryID, AmountMin, AmountMax, SourceBankID, Priority, AutoApply)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        pattern,
+                        match_type,
+                        int(category_id),
+                        amount_min,
+                        amount_max,
+                        source_bank_id,
+                        int(priority),
+                        1 if auto_apply else 0,
+                    ),
+                )
+                rule_id = connection._cursor.lastrowid
+                self._bump_data_version(connection, self.KEYWORD_RULES_VERSION)
+                return rule_id
+            finally:
+                connection.wrap_it_up()
+
+    @serialized_write
+    def update_category_keyword_rule(self, rule_id, category_id, priority, auto_apply=False):
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    """
+                    UPDATE tblCategoryKeywordRule
+                    SET CategoryID = ?, Priority = ?, AutoApply = ?
+                    WHERE RuleID = ?
+                    """,
+                    (int(category_id), int(priority), 1 if auto_apply else 0, int(rule_id)),
+                )
+                self._bump_data_version(connection, self.KEYWORD_RULES_VERSION)
+            finally:
+                connection.wrap_it_up()
+
+    @serialized_write
+    def delete_category_keyword_rule(self, rule_id):
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    "DELETE FROM tblCategoryKeywordRule WHERE RuleID = ?", (int(rule_id),)
+                )
+                self._bump_data_version(connection, self.KEYWORD_RULES_VERSION)
+            finally:
+                connection.wrap_it_up()
+
+    def get_source_banks(self):
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(
-                f"DELETE FROM tblTransaction WHERE InputFileID = {int(file_id)};"
+                "SELECT SourceBankID, Name FROM tblSourceBank ORDER BY Name ASC"
             )
+            return connection.get_results()
+        finally:
+            connection.wrap_it_up()
+
+    @serialized_write
+    def delete_transaction(self, tx_id):
+        sql = """
+                UPDATE tblTransaction 
+                SET DateDeleted = ?
+                WHERE TxID = ?;
+                """
+
+        connection = ConnectionWrapper(self.pool)
+        try:
             connection.execute_sql(
-                f"DELETE FROM tblInputFile WHERE InputFileID = {int(file_id)};"
+                sql, (TimeObserver.get_now_date_string(), int(tx_id))
             )
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
+    def delete_file_and_transactions(self, file_id):
+        """Permanently delete all transactions for this file and the input file record."""
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                connection.execute_sql(
+                    "DELETE FROM tblTransaction WHERE InputFileID = ?;", (int(file_id),)
+                )
+                connection.execute_sql(
+                    "DELETE FROM tblInputFile WHERE InputFileID = ?;", (int(file_id),)
+                )
+            finally:
+                connection.wrap_it_up()
+
     BUDGET_EXCLUDED_CATEGORIES = ("transfer", "credit card payment")
 
     def get_budget_template(self):
         """Return (total_income, list of (category_id, name, amount))."""
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql("SELECT TotalIncome FROM tblBudgetTemplate WHERE Id = 1")
             r = connection.get_results()
@@ -1065,7 +2694,7 @@ class SqliteClient:
             connection.wrap_it_up()
 
         amounts = {}
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(
                 "SELECT CategoryID, BudgetAmount FROM tblBudgetTemplateLine"
@@ -1083,29 +2712,31 @@ class SqliteClient:
         rows.sort(key=lambda x: x[1].lower())
         return income, rows
 
+    @serialized_write
     def save_budget_template(self, total_income, category_amounts):
         """category_amounts: {category_id: float}."""
-        connection = ConnectionWrapper(self.database_name)
-        try:
-            connection.execute_sql(
-                f"UPDATE tblBudgetTemplate SET TotalIncome = {float(total_income)} WHERE Id = 1"
-            )
-            connection.execute_sql("DELETE FROM tblBudgetTemplateLine")
-            for cat_id, amt in category_amounts.items():
-                cid = int(cat_id)
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
                 connection.execute_sql(
-                    f"INSERT INTO tblBudgetTemplateLine (CategoryID, BudgetAmount) VALUES ({cid}, {float(amt)});"
+                    "UPDATE tblBudgetTemplate SET TotalIncome = ? WHERE Id = 1",
+                    (float(total_income),),
                 )
-        finally:
-            connection.wrap_it_up()
+                connection.execute_sql("DELETE FROM tblBudgetTemplateLine")
+                connection.execute_many(
+                    "INSERT INTO tblBudgetTemplateLine (CategoryID, BudgetAmount) VALUES (?, ?);",
+                    [(int(cat_id), float(amt)) for cat_id, amt in category_amounts.items()],
+                )
+            finally:
+                connection.wrap_it_up()
 
     def get_monthly_budget(self, month_key):
         """Return (total_income, is_locked) or (None, None) if no row."""
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            safe = month_key.replace("'", "''")
             connection.execute_sql(
-                f"SELECT TotalIncome, IsLocked FROM tblMonthlyBudget WHERE MonthKey = '{safe}'"
+                "SELECT TotalIncome, IsLocked FROM tblMonthlyBudget WHERE MonthKey = ?",
+                (month_key,),
             )
             r = connection.get_results()
             if not r:
@@ -1116,61 +2747,67 @@ class SqliteClient:
 
     def get_monthly_budget_lines(self, month_key):
         """Return dict category_id -> amount."""
-        safe = month_key.replace("'", "''")
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
             connection.execute_sql(
-                f"SELECT CategoryID, BudgetAmount FROM tblMonthlyBudgetLine WHERE MonthKey = '{safe}'"
+                "SELECT CategoryID, BudgetAmount FROM tblMonthlyBudgetLine WHERE MonthKey = ?",
+                (month_key,),
             )
             return {int(row[0]): float(row[1]) for row in connection.get_results()}
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def save_monthly_budget(self, month_key, total_income, category_amounts, is_locked):
-        connection = ConnectionWrapper(self.database_name)
-        try:
-            safe = month_key.replace("'", "''")
-            locked = 1 if is_locked else 0
-            connection.execute_sql(
-                f"""INSERT INTO tblMonthlyBudget (MonthKey, TotalIncome, IsLocked)
-                VALUES ('{safe}', {float(total_income)}, {locked})
-                ON CONFLICT(MonthKey) DO UPDATE SET
-                TotalIncome = excluded.TotalIncome, IsLocked = excluded.IsLocked"""
-            )
-            connection.execute_sql(
-                f"DELETE FROM tblMonthlyBudgetLine WHERE MonthKey = '{safe}'"
-            )
-            for cat_id, amt in category_amounts.items():
-                cid = int(cat_id)
+        with self.transaction():
+            connection = ConnectionWrapper(self.pool)
+            try:
+                locked = 1 if is_locked else 0
                 connection.execute_sql(
-                    f"""INSERT INTO tblMonthlyBudgetLine (MonthKey, CategoryID, BudgetAmount)
-                    VALUES ('{safe}', {cid}, {float(amt)});"""
+                    """INSERT INTO tblMonthlyBudget (MonthKey, TotalIncome, IsLocked)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(MonthKey) DO UPDATE SET
+                    TotalIncome = excluded.TotalIncome, IsLocked = excluded.IsLocked""",
+                    (month_key, float(total_income), locked),
                 )
-        finally:
-            connection.wrap_it_up()
+                connection.execute_sql(
+                    "DELETE FROM tblMonthlyBudgetLine WHERE MonthKey = ?", (month_key,)
+                )
+                connection.execute_many(
+                    """INSERT INTO tblMonthlyBudgetLine (MonthKey, CategoryID, BudgetAmount)
+                    VALUES (?, ?, ?);""",
+                    [
+                        (month_key, int(cat_id), float(amt))
+                        for cat_id, amt in category_amounts.items()
+                    ],
+                )
+            finally:
+                connection.wrap_it_up()
 
+    @serialized_write
     def set_monthly_budget_locked(self, month_key, locked=True):
-        connection = ConnectionWrapper(self.database_name)
+        connection = ConnectionWrapper(self.pool)
         try:
-            safe = month_key.replace("'", "''")
             v = 1 if locked else 0
             connection.execute_sql(
-                f"UPDATE tblMonthlyBudget SET IsLocked = {v} WHERE MonthKey = '{safe}'"
+                "UPDATE tblMonthlyBudget SET IsLocked = ? WHERE MonthKey = ?",
+                (v, month_key),
             )
         finally:
             connection.wrap_it_up()
 
+    @serialized_write
     def copy_template_to_month(self, month_key):
         """Create or update a monthly budget from the template; preserves lock state if row exists."""
         template_income, rows = self.get_budget_template()
         lines = {int(cat_id): float(amt) for cat_id, _name, amt in rows}
         income = float(template_income)
-        safe = month_key.replace("'", "''")
-        sub = ConnectionWrapper(self.database_name)
+        sub = ConnectionWrapper(self.pool)
         try:
             sub.execute_sql(
-                f"SELECT IsLocked FROM tblMonthlyBudget WHERE MonthKey = '{safe}'"
+                "SELECT IsLocked FROM tblMonthlyBudget WHERE MonthKey = ?", (month_key,)
             )
+
             r = sub.get_results()
             is_locked = int(r[0][0]) == 1 if r else 0
         finally:
@@ -1180,25 +2817,48 @@ class SqliteClient:
             month_key, income, lines, is_locked=bool(is_locked)
         )
 
+    def _category_month_total_sum_query(self, start_month_key, end_month_key):
+        sql = """
+        SELECT cat.CategoryID, COALESCE(SUM(r.NetSum), 0)
+        FROM tblCategoryMonthTotal r
+        INNER JOIN tblCategory cat ON r.CategoryID = cat.CategoryID
+        WHERE cat.Name NOT IN ('transfer', 'credit card payment')
+          AND r.MonthKey >= ?
+          AND r.MonthKey < ?
+        GROUP BY cat.CategoryID
+        """
+        return sql, (start_month_key, end_month_key)
+
+    def _category_month_totals_query(self, start_month_key, end_month_key):
+        sql = """
+        SELECT r.MonthKey, cat.Name, ROUND(r.NetSum, 2)
+        FROM tblCategoryMonthTotal r
+        INNER JOIN tblCategory cat ON r.CategoryID = cat.CategoryID
+        WHERE cat.Name NOT IN ('transfer', 'credit card payment')
+          AND r.MonthKey >= ?
+          AND r.MonthKey < ?
+        ORDER BY r.MonthKey ASC
+        """
+        return sql, (start_month_key, end_month_key)
+
+    def get_category_month_totals(self, start_month_key, end_month_key):
+        """Return (month_key, category_name, net_sum) for months in [start, end), read from the rollup."""
+        sql, params = self._category_month_totals_query(start_month_key, end_month_key)
+        connection = ConnectionWrapper(self.pool)
+        try:
+            connection.execute_sql(sql, params)
+            return connection.get_results()
+        finally:
+            connection.wrap_it_up()
+
     def get_category_tx_sum_for_month(self, month_key):
         """Return dict category_id -> sum(TxDenomination) for the calendar month, excluding
         system categories, non-deleted rows only.
         """
-        ts_start = get_timestamp_for_datekey(month_key)
-        ts_end = get_timestamp_for_datekey(add_month(month_key))
-        sql = f"""
-        SELECT cat.CategoryID, COALESCE(SUM(tx.TxDenomination), 0)
-        FROM tblTransaction tx
-        INNER JOIN tblCategory cat ON tx.TxCategoryID = cat.CategoryID
-        WHERE cat.Name NOT IN ('transfer', 'credit card payment')
-          AND tx.DateDeleted IS NULL
-          AND tx.TxDateTimestamp >= {ts_start}
-          AND tx.TxDateTimestamp < {ts_end}
-        GROUP BY cat.CategoryID
-        """
-        connection = ConnectionWrapper(self.database_name)
+        sql, params = self._category_month_total_sum_query(month_key, add_month(month_key))
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, params)
             return {int(row[0]): float(row[1]) for row in connection.get_results()}
         finally:
             connection.wrap_it_up()
@@ -1206,28 +2866,17 @@ class SqliteClient:
     def get_category_6mo_avg_monthly_spend(self, end_month_key):
         """For each category, (sum of TxDenomination) / 6 for transactions in
         the six full calendar months before end_month (not including end_month):
-        [add_month(end, -6), add_month(end, 0)) in timestamp form.
+        month keys [add_month(end, -6), end), read from tblCategoryMonthTotal.
 
         Returns dict category_id -> value where value is -total/6.0, so a typical
         net outflow shows as a positive number (credits in the window show as
         negative or small).
         """
         start_key = add_month(end_month_key, -6)
-        ts_start = get_timestamp_for_datekey(start_key)
-        ts_end = get_timestamp_for_datekey(end_month_key)
-        sql = f"""
-        SELECT cat.CategoryID, COALESCE(SUM(tx.TxDenomination), 0) AS T
-        FROM tblTransaction tx
-        INNER JOIN tblCategory cat ON tx.TxCategoryID = cat.CategoryID
-        WHERE cat.Name NOT IN ('transfer', 'credit card payment')
-          AND tx.DateDeleted IS NULL
-          AND tx.TxDateTimestamp >= {ts_start}
-          AND tx.TxDateTimestamp < {ts_end}
-        GROUP BY cat.CategoryID
-        """
-        connection = ConnectionWrapper(self.database_name)
+        sql, params = self._category_month_total_sum_query(start_key, end_month_key)
+        connection = ConnectionWrapper(self.pool)
         try:
-            connection.execute_sql(sql)
+            connection.execute_sql(sql, params)
             out = {}
             for row in connection.get_results():
                 cid = int(row[0])
@@ -0,0 +1,137 @@
+import fcntl
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from database.connection_pool import ConnectionPool
+
+
+class WriterStoppedError(Exception):
+    pass
+
+
+class WriteQueue:
+    """Runs every write job of a process on one thread, several to a commit.
+
+    submit() queues a callable and returns a Future for its result.  The writer
+    thread takes whatever jobs have piled up (up to max_batch), opens a single
+    BEGIN IMMEDIATE transaction for them and commits once, so a burst of small
+    writes costs one fsync instead of one each.  Each job runs inside its own
+    savepoint: a job that raises is rolled back on its own and its Future gets
+    the exception, while the rest of the batch still commits.
+
+    The transaction is only opened while holding an exclusive flock on
+    lock_path, which lines up the writers of every process sharing the database
+    (e.g. gunicorn workers) instead of leaving them to SQLite's busy retry loop.
+
+    Only an Exception fails a batch; anything else (KeyboardInterrupt, SystemExit)
+    stops the writer, failing every job it hadn't finished with WriterStoppedError,
+    and later submit() calls fail straight away.
+    """
+
+    def __init__(self, pool: ConnectionPool, lock_path, max_batch=64):
+        self.pool = pool
+        self.lock_path = lock_path
+        self.max_batch = max_batch
+
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._stopped = False
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="sqlite-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        self.start()
+        future = Future()
+        with self._start_lock:
+            if self._stopped:
+                future.set_exception(WriterStoppedError("The sqlite writer thread has stopped"))
+            else:
+                self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    def runs_here(self):
+        """True when called from the writer thread itself (i.e. from inside a job)."""
+        return threading.current_thread() is self._thread
+
+    def _run(self):
+        batch = []
+        try:
+            self.pool.checkout_dedicated()
+            with open(self.lock_path, "a") as lock_file:
+                while True:
+                    batch = [self._jobs.get()]
+                    while len(batch) < self.max_batch:
+                        try:
+                            batch.append(self._jobs.get_nowait())
+                        except queue.Empty:
+                            break
+
+                    batch = [job for job in batch if job[0].set_running_or_notify_cancel()]
+                    if not batch:
+                        continue
+
+                    try:
+                        with self._process_lock(lock_file):
+                            results = self._commit_batch(batch)
+                    except Exception as e:
+                        # The commit itself failed, so nothing in the batch was written
+                        logging.exception("Write batch of %d jobs failed" % len(batch))
+                        for future, _, _, _ in batch:
+                            future.set_exception(e)
+                        continue
+
+                    for (future, _, _, _), (ok, value) in zip(batch, results):
+                        if ok:
+                            future.set_result(value)
+                        else:
+                            future.set_exception(value)
+        finally:
+            self._fail_pending(batch)
+
+    def _fail_pending(self, batch):
+        with self._start_lock:
+            self._stopped = True
+
+        logging.error("sqlite writer thread stopped")
+        error = WriterStoppedError("The sqlite writer thread stopped before this write finished")
+        while True:
+            try:
+                batch.append(self._jobs.get_nowait())
+            except queue.Empty:
+                break
+
+        for future, _, _, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    @contextmanager
+    def _process_lock(self, lock_file):
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _commit_batch(self, batch):
+        results = []
+        with self.pool.transaction() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for future, fn, args, kwargs in batch:
+                try:
+                    with self.pool.savepoint(connection, "write_job"):
+                        value = fn(*args, **kwargs)
+                except Exception as e:
+                    results.append((False, e))
+                else:
+                    results.append((True, value))
+        return results
@@ -9,7 +9,17 @@ git pull origin main
 echo "Installing dependencies..."
 venv/bin/pip install -r requirements.txt
 
-echo "Restarting service..."
-sudo systemctl restart moneypit-app
+# Stop the old code before migrating: the backfills (dedupe keys, normalized memos,
+# merchant IDs) only cover rows that exist while they run, so nothing may insert
+# rows between them and the new code starting.  If a migration fails the service
+# is left stopped rather than serving a half-migrated schema.
+echo "Stopping service..."
+sudo systemctl stop moneypit-app
+
+echo "Migrating database..."
+venv/bin/python -m database.migrations apply sqlite/tx.db
+
+echo "Starting service..."
+sudo systemctl start moneypit-app
 
 echo "Done."
@@ -1,8 +1,12 @@
+import concurrent.futures
+import functools
+import hashlib
 import os
+import re
 import shutil
 import sys
 
-from flask import Flask, request, render_template, redirect, jsonify, session, url_for, flash, send_file, after_this_request
+from flask import Flask, request, render_template, redirect, jsonify, session, url_for, flash, get_template_attribute, make_response, Response
 from datetime import datetime
 from json2html import *
 import pytz
@@ -13,7 +17,9 @@ from wtforms import FileField, SubmitField, SelectField
 from categories.categorizer import Categorizer
 from data_containers.data_heatmap import DataHeatmap
 from data_containers.input_file import InputFile
+from utility.memo_helper import clean_memo
 from utility.money_helper import format_money
+from utility.response_cache import ResponseCache
 from utility.time_helper import (
     format_timestamp,
     get_timestamp_for_datekey,
@@ -26,12 +32,15 @@ from utility.time_helper import (
 )
 import coloredlogs, logging
 
+from database.backup import available_compressions, snapshot_filename, stream_snapshot
 from database.sqlite_client import SqliteClient
 from utility.time_observer import TimeObserver
 
 app = Flask(__name__, static_url_path="/moneypit/static")
 app.config["SECRET_KEY"] = "supersecretkey"
 db_client = SqliteClient("sqlite/tx.db")
+db_client.start_wal_checkpoints()
+db_client.start_writer()
 
 _logger = logging.getLogger("moneypit")
 logFormatter = logging.Formatter("%(asctime)s [%(levelname)-5.5s]  %(message)s")
@@ -44,6 +53,51 @@ coloredlogs.install(level="DEBUG")
 
 IGNORED_CATEGORIES = ["credit card payment", "account transfers"]
 
+# Rendered read-only pages; see cached_view
+response_cache = ResponseCache()
+
+
+def get_code_version():
+    """Hash of every .py file in the app and every template.
+
+    Part of every ETag, so a deploy that changes how pages render (views, queries,
+    helpers or templates) never answers 304 with an old page, while every worker
+    running the same code agrees on ETags.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    paths = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(
+            d for d in dirnames if not d.startswith(".") and d not in ("tests", "__pycache__")
+        )
+        in_templates = os.path.relpath(directory, root).split(os.sep)[0] == "templates"
+        paths.extend(
+            os.path.join(directory, name)
+            for name in sorted(filenames)
+            if name.endswith(".py") or in_templates
+        )
+
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(os.path.relpath(path, root).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+_RESPONSE_CACHE_EPOCH = get_code_version()
+
+
+@app.before_request
+def checkout_db_connection():
+    # Hold one pooled connection for the whole request so every query reuses it
+    db_client.pool.checkout()
+
+
+@app.teardown_request
+def release_db_connection(exception=None):
+    db_client.pool.release()
+
 
 @app.context_processor
 def inject_uncategorized_count():
@@ -60,27 +114,82 @@ def get_adjusted_offset_seconds():
     return now.utcoffset().total_seconds()
 
 
+def cached_view(view):
+    """Serve a read-only GET view from response_cache, with an ETag.
+
+    Pages are keyed on the endpoint, its arguments, today's date (for views that
+    default to "now") and the global data version, which every committed write
+    bumps.  A browser revalidating a page whose key hasn't changed gets a 304
+    without the view running at all.  POSTs and requests with flashed messages
+    waiting to be shown always run the view.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET" or session.get("_flashes"):
+            return view(*args, **kwargs)
+
+        key = (
+            request.endpoint,
+            tuple(sorted(kwargs.items())),
+            tuple(sorted(request.args.items(multi=True))),
+            datetime.now().date().isoformat(),
+            db_client.get_data_version(SqliteClient.DATA_VERSION),
+        )
+        etag = hashlib.sha1((_RESPONSE_CACHE_EPOCH + repr(key)).encode("utf-8")).hexdigest()
+
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            body = response_cache.get(key)
+            if body is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.mimetype != "text/html":
+                    return response
+                body = response.get_data()
+                response_cache.put(key, body)
+            response = app.response_class(body, mimetype="text/html")
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    return wrapper
+
+
+def get_month_range_args():
+    """(ts_start_key, ts_start, ts_end_key, ts_end) from the ts_start/ts_end query args.
+
+    Defaults to six months back through next month.  Keys are normalized to YYYY-MM,
+    since MonthKey bounds are compared as strings; raises ValueError for a key that
+    isn't a month.
+    """
+    date_key_now = get_datekey_for_timestamp(timestamp_now())
+    ts_start = get_timestamp_for_datekey(
+        request.args.get("ts_start") or add_month(date_key_now, -6)
+    )
+    ts_end = get_timestamp_for_datekey(
+        request.args.get("ts_end") or add_month(date_key_now, 1)
+    )
+    return (
+        get_datekey_for_timestamp(ts_start),
+        ts_start,
+        get_datekey_for_timestamp(ts_end),
+        ts_end,
+    )
+
+
 @app.route("/moneypit/heatmap/months")
+@cached_view
 def heatmap_months():
     core_expenses_param = request.args.get("core_expenses", "")
     exclude_core = core_expenses_param == "Exclude"
     only_core = core_expenses_param == "Only"
 
-    date_key_now = get_datekey_for_timestamp(timestamp_now())
-
-    if request.args.get("ts_start"):
-        ts_start_key = request.args.get("ts_start")
-        ts_start = get_timestamp_for_datekey(ts_start_key)
-    else:
-        ts_start_key = add_month(date_key_now, -6)
-        ts_start = get_timestamp_for_datekey(ts_start_key)
-
-    if request.args.get("ts_end"):
-        ts_end_key = request.args.get("ts_end")
-        ts_end = get_timestamp_for_datekey(ts_end_key)
-    else:
-        ts_end_key = add_month(date_key_now, 1)
-        ts_end = get_timestamp_for_datekey(ts_end_key)
+    try:
+        ts_start_key, ts_start, ts_end_key, ts_end = get_month_range_args()
+    except ValueError:
+        return "ts_start and ts_end must be months (YYYY-MM)", 400
 
     core_expense_names = db_client.get_core_expense_category_names()
     additional_ignored_categories = []
@@ -93,11 +202,11 @@ def heatmap_months():
         core_expense_names=core_expense_names,
     )
 
-    logging.debug("looking up data with %d -> %d" % (ts_start, ts_end))
-    results = db_client.get_data_for_time_slice(ts_start, ts_end)
+    logging.debug("looking up data with %s -> %s" % (ts_start_key, ts_end_key))
+    results = db_client.get_category_month_totals(ts_start_key, ts_end_key)
 
     heatmap_data_container = DataHeatmap()
-    heatmap_data_container.init_from_raw(results, filtered_categories)
+    heatmap_data_container.init_from_month_totals(results, filtered_categories)
 
     return render_template(
         "heatmap.html",
@@ -112,35 +221,24 @@ def heatmap_months():
 
 
 @app.route("/moneypit/graphs")
+@cached_view
 def graphs():
-    date_key_now = get_datekey_for_timestamp(timestamp_now())
-
-    if request.args.get("ts_start"):
-        ts_start_key = request.args.get("ts_start")
-        ts_start = get_timestamp_for_datekey(ts_start_key)
-    else:
-        ts_start_key = add_month(date_key_now, -6)
-        ts_start = get_timestamp_for_datekey(ts_start_key)
-
-    if request.args.get("ts_end"):
-        ts_end_key = request.args.get("ts_end")
-        ts_end = get_timestamp_for_datekey(ts_end_key)
-    else:
-        ts_end_key = add_month(date_key_now, 1)
-        ts_end = get_timestamp_for_datekey(ts_end_key)
+    try:
+        ts_start_key, ts_start, ts_end_key, ts_end = get_month_range_args()
+    except ValueError:
+        return "ts_start and ts_end must be months (YYYY-MM)", 400
 
     filtered_categories = get_filtered_categories()
-    results = db_client.get_data_for_time_slice(ts_start, ts_end)
+    results = db_client.get_category_month_totals(ts_start_key, ts_end_key)
 
     heatmap_data_container = DataHeatmap()
-    heatmap_data_container.init_from_raw(results, filtered_categories)
+    heatmap_data_container.init_from_month_totals(results, filtered_categories)
 
     # Aggregate each category's total spend across the whole date range
-    category_totals = {}
-    for date_key in heatmap_data_container.get_dates():
-        for cat in heatmap_data_container.the_matrix[date_key]:
-            val = heatmap_data_container.the_matrix[date_key][cat]
-            category_totals[cat] = category_totals.get(cat, 0) + val
+    category_totals = {
+        cat: heatmap_data_container.get_row_total(cat)
+        for cat in heatmap_data_container.get_categories()
+    }
 
     # Sankey: node 0 = "Total Spend", nodes 1..N = expense categories only
     expense_cats = {k: round(abs(v), 2) for k, v in category_totals.items() if v < 0}
@@ -176,8 +274,8 @@ def graphs():
     time_series_categories = sorted(expense_cats.keys(), key=lambda c: expense_cats[c], reverse=True)
     time_series_data = {
         cat: [
-            round(abs(heatmap_data_container.the_matrix.get(m, {}).get(cat, 0)), 2)
-            for m in month_range
+            round(abs(v), 2)
+            for v in heatmap_data_container.get_values_for_category(cat, month_range)
         ]
         for cat in time_series_categories
     }
@@ -200,6 +298,7 @@ def graphs():
 
 
 @app.route("/moneypit/heatmap/weeks")
+@cached_view
 def heatmap_week_transactions():
     core_expenses_param = request.args.get("core_expenses", "")
     exclude_core = core_expenses_param == "Exclude"
@@ -229,6 +328,7 @@ def heatmap_week_transactions():
 
 
 @app.route("/moneypit/heatmap/transactions")
+@cached_view
 def heatmap_month_transactions():
     ts_start_key = request.args.get("ts_start")
     ts_end_key = request.args.get("ts_end")
@@ -327,6 +427,13 @@ class UploadFileForm(FlaskForm):
     submit = SubmitField("Upload file")
 
 
+# insert_file() gave up waiting on the writer.  An import that had already started
+# keeps going and may still commit; one still queued was dropped, and uploading the
+# file again is safe either way since re-imported rows are deduplicated.
+UPLOAD_STILL_PROCESSING = (
+    "File is still being imported. If its transactions don't show up shortly, upload it again."
+)
+
 SOURCE_CHOICES = [
     ("Chase", "Chase"),
     ("CapitalOne", "Capital One"),
@@ -337,23 +444,23 @@ SOURCE_CHOICES = [
 
 @app.route("/moneypit/backup/download")
 def backup_download():
-    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sqlite", "tx.db")
-    if not os.path.isfile(db_path):
-        return "Database not found", 404
-    timestamp = datetime.now().strftime("%Y-%m-%d-%H%M%S")
-    filename = f"moneypit-backup-{timestamp}.db"
-    temp_path = os.path.join("/tmp", filename)
-    shutil.copy2(db_path, temp_path)
-
-    @after_this_request
-    def remove_temp(response):
-        try:
-            os.remove(temp_path)
-        except OSError:
-            pass
-        return response
+    # ?compression=gzip (or zstd, if installed) compresses the snapshot as it streams out
+    compression = request.args.get("compression", "none")
+    if compression not in available_compressions():
+        return "Unsupported compression: %s" % compression, 400
+
+    snapshot = db_client.snapshot()
+    headers = {
+        "Content-Disposition": "attachment; filename=%s" % snapshot_filename(compression)
+    }
+    if compression == "none":
+        headers["Content-Length"] = str(len(snapshot))
 
-    return send_file(temp_path, as_attachment=True, download_name=filename)
+    return Response(
+        stream_snapshot(snapshot, compression),
+        mimetype="application/octet-stream",
+        headers=headers,
+    )
 
 
 @app.route("/moneypit/transaction/upload", methods=["POST", "GET"])
@@ -371,6 +478,9 @@ def upload_file():
             input_file.insert_file(filepath)
             flash("File uploaded successfully", "success")
             return redirect(url_for("heatmap_months"))
+        except concurrent.futures.TimeoutError:
+            flash(UPLOAD_STILL_PROCESSING, "info")
+            return redirect(url_for("heatmap_months"))
         except Exception as e:
             if "No idea how to parse it:" in str(e):
                 session["upload_pending_path"] = filepath
@@ -411,6 +521,9 @@ def select_source():
             shutil.copy2(filepath, new_filepath)
             input_file = InputFile(db_client)
             input_file.insert_file(new_filepath)
+            flash("File uploaded successfully", "success")
+        except concurrent.futures.TimeoutError:
+            flash(UPLOAD_STILL_PROCESSING, "info")
         finally:
             try:
                 os.remove(filepath)
@@ -419,7 +532,6 @@ def select_source():
 
         session.pop("upload_pending_path", None)
         session.pop("upload_pending_filename", None)
-        flash("File uploaded successfully", "success")
         return redirect(url_for("heatmap_months"))
 
     return render_template(
@@ -430,7 +542,7 @@ def select_source():
 
 
 def render_uncategorized_transactions_group_page():
-    open_transactions = db_client.get_uncategorized_transactions()
+    first_memo_raw, group_rows, total_remaining = db_client.get_next_uncategorized_group()
 
     categorizer = Categorizer(db_client)
 
@@ -438,18 +550,17 @@ def render_uncategorized_transactions_group_page():
     tx_ids = []
     category_name = ""
     category_guess = None
-    total_remaining = len(open_transactions)
-    if len(open_transactions) > 0:
-        first_memo_raw = open_transactions[0][2]
-
-        # Find every other transaction that has the same memo (group by raw bank description)
-        for tx_id, denomination, memo_raw, custom_memo, date, source in open_transactions:
-            if memo_raw == first_memo_raw:
-                display_memo = custom_memo if custom_memo else memo_raw
-                transaction_group.append((tx_id, denomination, display_memo, date, source))
-                tx_ids.append(tx_id)
-
-        category_guess = categorizer.guess_best_category(first_memo_raw)
+    if group_rows:
+        # Every uncategorized transaction that has the same memo (group by raw bank description)
+        for tx_id, denomination, memo_raw, custom_memo, date, source in group_rows:
+            display_memo = custom_memo if custom_memo else memo_raw
+            transaction_group.append((tx_id, denomination, display_memo, date, source))
+            tx_ids.append(tx_id)
+
+        first_tx = group_rows[0]
+        category_guess = categorizer.guess_best_category(
+            first_memo_raw, amount=first_tx[1], source_bank=first_tx[5]
+        )
         _logger.info("Guessed category for group: " + str(category_guess))
 
     if category_guess:
@@ -470,10 +581,17 @@ def render_file_transactions_page():
 
     categorizer = Categorizer(db_client)
 
+    category_guesses = categorizer.guess_best_categories(
+        [tx[2] for tx in open_transactions],
+        amounts=[tx[1] for tx in open_transactions],
+        source_banks=[tx[5] for tx in open_transactions],
+    )
+
     open_transactions_categorized = []
-    for tx_id, denomination, memo_raw, custom_memo, date, source in open_transactions:
+    for (tx_id, denomination, memo_raw, custom_memo, date, source), category_guess in zip(
+        open_transactions, category_guesses
+    ):
         display_memo = custom_memo if custom_memo else memo_raw
-        category_guess = categorizer.guess_best_category(memo_raw)
 
         category_name = ""
         if category_guess is not None:
@@ -482,10 +600,20 @@ def render_file_transactions_page():
             (tx_id, denomination, display_memo, date, source, category_name)
         )
 
+    # The <option> list only depends on which category is preselected, so render it
+    # once per distinct guess instead of looping over every category on every row
+    categories_list = db_client.get_categories()
+    category_ids = {cat_name: cat_id for cat_id, cat_name in categories_list}
+    render_options = get_template_attribute("category_options.html", "category_options")
+    category_options = {
+        category_name: render_options(categories_list, category_ids.get(category_name))
+        for category_name in {row[5] for row in open_transactions_categorized}
+    }
+
     return render_template(
         "resolve_categories.html",
         open_txs=open_transactions_categorized,
-        categories_list=db_client.get_categories(),
+        category_options=category_options,
     )
 
 
@@ -526,11 +654,7 @@ def save_categories():
     category_ids = request.form.getlist("category-id")
     tx_ids = request.form.getlist("tx-id")
 
-    iter = 0
-    while iter < len(category_ids):
-        cat_id = category_ids[iter]
-        db_client.update_category(int(tx_ids[iter]), int(cat_id) if cat_id else None)
-        iter = iter + 1
+    db_client.update_categories(zip(tx_ids, category_ids))
 
     return heatmap_months()
 
@@ -541,10 +665,7 @@ def save_category_for_tx_group():
     tx_ids = request.form["tx-ids"].split(",")
 
     cat_id = int(category_id) if category_id else None
-    iter = 0
-    while iter < len(tx_ids):
-        db_client.update_category(int(tx_ids[iter]), cat_id)
-        iter = iter + 1
+    db_client.update_categories((tx_id, cat_id) for tx_id in tx_ids)
 
     # Make note of it for the future so it will show up next time (only when categorizing, not uncategorizing)
     if cat_id:
@@ -563,32 +684,21 @@ def all_transactions():
 
 @app.route("/moneypit/api/transactions/search", methods=["GET"])
 def api_search_transactions():
-    from Levenshtein import distance as levenshtein_distance
-
     memo_query = request.args.get("q", "").strip()
     category_filter = request.args.get("category", "").strip()
 
+    # Ranked best match first when there's a query, newest first otherwise
     results = db_client.search_transactions(
         memo_query=memo_query,
         category_filter=category_filter,
-        limit=300,
+        limit=200,
     )
 
-    # If there's a query, sort by fuzzy similarity (best match first)
-    if memo_query:
-        query_lower = memo_query.lower()
-        def score(tx):
-            memo_lower = tx["Memo"].lower()
-            # Exact substring → score 0 (best); otherwise Levenshtein on the memo
-            if query_lower in memo_lower:
-                return 0
-            return levenshtein_distance(query_lower, memo_lower[:len(query_lower) + 10])
-        results.sort(key=score)
-
-    return jsonify(results[:200])
+    return jsonify(results)
 
 
 @app.route("/moneypit/files", methods=["GET"])
+@cached_view
 def list_files():
     all_files = db_client.get_all_input_files()
     source_filter = request.args.get("source", "").strip()
@@ -641,6 +751,34 @@ def api_update_tx_category(tx_id):
     return jsonify({"ok": True, "tx_id": tx_id, "category_id": cat_id})
 
 
+@app.route("/moneypit/api/transactions/category", methods=["POST"])
+def api_update_tx_categories():
+    """Save many categories at once: {"updates": [{"tx_id": 1, "category_id": 2}, ...]}"""
+    data = request.get_json(silent=True)
+    updates = data.get("updates") if isinstance(data, dict) else None
+    if not isinstance(updates, list):
+        return jsonify({"ok": False, "error": "missing updates array"}), 400
+
+    pairs = []
+    for update in updates:
+        if not isinstance(update, dict) or "tx_id" not in update or "category_id" not in update:
+            return jsonify({"ok": False, "error": "each update needs tx_id and category_id"}), 400
+        category_id = update["category_id"]
+        try:
+            # Allow null/None to set uncategorized
+            cat_id = int(category_id) if category_id is not None and category_id != "" else None
+            pairs.append((int(update["tx_id"]), cat_id))
+        except (TypeError, ValueError):
+            return jsonify({"ok": False, "error": "tx_id and category_id must be integers"}), 400
+
+    updated = db_client.update_categories(pairs)
+    return jsonify({
+        "ok": True,
+        "updated": updated,
+        "updates": [{"tx_id": tx_id, "category_id": cat_id} for tx_id, cat_id in pairs],
+    })
+
+
 @app.route("/moneypit/api/transaction/<int:tx_id>/custom-memo", methods=["POST"])
 def api_update_tx_custom_memo(tx_id):
     data = request.get_json()
@@ -668,6 +806,9 @@ def manage_category_matches():
         "category_matches.html",
         groups=groups,
         categories=categories,
+        keyword_rules=db_client.get_category_keyword_rules(),
+        match_types=db_client.KEYWORD_RULE_MATCH_TYPES,
+        source_banks=db_client.get_source_banks(),
     )
 
 
@@ -690,6 +831,88 @@ def reassign_category_match():
     return redirect("/moneypit/categories/matches")
 
 
+def _parse_optional_amount(value):
+    value = (value or "").strip()
+    return float(value) if value else None
+
+
+@app.route("/moneypit/categories/matches/rules/add", methods=["POST"])
+def add_category_keyword_rule():
+    pattern = request.form.get("pattern", "")
+    match_type = request.form.get("match-type", "substring")
+    category_id = request.form.get("category-id", "").strip()
+    priority = request.form.get("priority", "").strip()
+    source_bank_id = request.form.get("source-bank-id", "").strip()
+
+    if not pattern.strip() or not category_id:
+        flash("A keyword rule needs a pattern and a category.", "error")
+        return redirect("/moneypit/categories/matches")
+
+    if match_type == "regex":
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            flash(f"Invalid regex: {e}", "error")
+            return redirect("/moneypit/categories/matches")
+    elif not clean_memo(pattern).strip():
+        # Would be an empty keyword, which matches every memo
+        flash("That pattern has no letters or digits to match on.", "error")
+        return manage_category_matches(), 400
+
+    try:
+        amount_min = _parse_optional_amount(request.form.get("amount-min"))
+        amount_max = _parse_optional_amount(request.form.get("amount-max"))
+    except ValueError:
+        flash("Amount bounds must be numbers.", "error")
+        return redirect("/moneypit/categories/matches")
+
+    try:
+        priority = int(priority) if priority else None
+    except ValueError:
+        flash("Priority must be a whole number.", "error")
+        return redirect("/moneypit/categories/matches")
+
+    rule_id = db_client.add_category_keyword_rule(
+        pattern,
+        match_type,
+        category_id,
+        amount_min=amount_min,
+        amount_max=amount_max,
+        source_bank_id=int(source_bank_id) if source_bank_id else None,
+        priority=priority,
+        auto_apply=bool(request.form.get("auto-apply")),
+    )
+    _logger.info(f"Added keyword rule {rule_id}: {match_type} '{pattern}' -> category_id={category_id}")
+    return redirect("/moneypit/categories/matches")
+
+
+@app.route("/moneypit/categories/matches/rules/update", methods=["POST"])
+def update_category_keyword_rule():
+    rule_id = request.form["rule-id"]
+    try:
+        priority = int(request.form.get("priority", "").strip())
+    except ValueError:
+        flash("Priority must be a whole number.", "error")
+        return redirect("/moneypit/categories/matches")
+
+    db_client.update_category_keyword_rule(
+        rule_id,
+        request.form["category-id"],
+        priority,
+        auto_apply=bool(request.form.get("auto-apply")),
+    )
+    _logger.info(f"Updated keyword rule {rule_id}")
+    return redirect("/moneypit/categories/matches")
+
+
+@app.route("/moneypit/categories/matches/rules/delete", methods=["POST"])
+def delete_category_keyword_rule():
+    rule_id = request.form["rule-id"]
+    db_client.delete_category_keyword_rule(rule_id)
+    _logger.info(f"Deleted keyword rule {rule_id}")
+    return redirect("/moneypit/categories/matches")
+
+
 @app.route("/moneypit/categories/core-expenses", methods=["GET"])
 def manage_core_expenses():
     core_expenses = db_client.get_core_expense_categories()
@@ -811,6 +1034,7 @@ def _rows_for_month_progress(month_key):
 
 
 @app.route("/moneypit/budget", methods=["GET"])
+@cached_view
 def budget_current_month():
     month_key = _parse_month_key_param(request.args.get("month"))
     prev_m = add_month(month_key, -1)
@@ -846,6 +1070,7 @@ def budget_current_month():
 
 
 @app.route("/moneypit/budget/template", methods=["GET", "POST"])
+@cached_view
 def budget_template():
     if request.method == "POST":
         inc = _parse_budget_income_from_form()
@@ -867,6 +1092,7 @@ def budget_template():
 
 
 @app.route("/moneypit/budget/plan", methods=["GET", "POST"])
+@cached_view
 def budget_plan_month():
     month_key = _parse_month_key_param(request.args.get("month"))
 
@@ -0,0 +1,18 @@
+from categories.categorizer import Categorizer
+from database.sqlite_client import SqliteClient
+
+
+def test_exact_match_ignores_surrounding_whitespace_like_the_backfill(tmp_path):
+    db_client = SqliteClient(str(tmp_path / "tx.db"))
+    db_client.insert_category("dining out")
+    db_client.insert_input_file(1, 0, "2024-01-01", "chase_2024.csv")
+    file_id = db_client.get_input_file_id(1, "chase_2024.csv")[0]
+    db_client.insert_transactions([(-1250, "2024-01-02", 1704153600, "  LOCAL DINER #12 ")], file_id)
+
+    db_client.add_match_rule_and_apply("Local Diner #12", db_client.get_category_id("dining out"))
+
+    # The SQL backfill matched it through TxMemoNormalized ...
+    assert db_client.get_uncategorized_transactions_count() == 0
+    # ... so the in-memory index has to agree
+    guess = Categorizer(db_client).guess_best_category("  LOCAL DINER #12 ")
+    assert guess is not None and guess["category_name"] == "dining out"
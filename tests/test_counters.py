@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+from data_containers.input_file import InputFile
+from database.sqlite_client import SqliteClient
+
+CHASE_EXPORT = """Transaction Date,Post Date,Description,Category,Type,Amount,Memo
+01/02/2024,01/03/2024,SOME LOCAL DINER,Food & Drink,Sale,-22.50,
+01/03/2024,01/04/2024,WHOLEFDS AVR 10371,Groceries,Sale,-61.20,
+01/04/2024,01/05/2024,CORNER BAKERY,Food & Drink,Sale,-4.25,
+01/05/2024,01/06/2024,SOME LOCAL DINER,Food & Drink,Sale,-18.00,
+"""
+
+
+def recount(database_name):
+    connection = sqlite3.connect(database_name)
+    try:
+        return connection.execute(
+            "SELECT COUNT(*) FROM tblTransaction WHERE TxCategoryID IS NULL AND DateDeleted IS NULL"
+        ).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def assert_counter_matches(db_client, expected):
+    assert recount(db_client.database_name) == expected
+    assert db_client.get_uncategorized_transactions_count() == expected
+
+
+def tx_ids(db_client, memo):
+    return sorted(row["ID"] for row in db_client.search_transactions(memo))
+
+
+@pytest.fixture
+def db_client(tmp_path):
+    db_client = SqliteClient(str(tmp_path / "tx.db"))
+    db_client.insert_category("dining out")
+    db_client.insert_category("groceries")
+    return db_client
+
+
+def test_counter_follows_every_kind_of_write(db_client, tmp_path):
+    groceries = db_client.get_category_id("groceries")
+    # Imported rows matching it are categorized on the way in
+    db_client.add_match_rule_and_apply("WHOLEFDS AVR 10371", groceries)
+
+    export = tmp_path / "chase_2024.csv"
+    export.write_text(CHASE_EXPORT)
+    InputFile(db_client).insert_file(str(export))
+    assert_counter_matches(db_client, 3)
+
+    # Backfilled by a new match rule
+    db_client.add_match_rule_and_apply("SOME LOCAL DINER", db_client.get_category_id("dining out"))
+    assert_counter_matches(db_client, 1)
+
+    bakery = tx_ids(db_client, "bakery")[0]
+    diner = tx_ids(db_client, "diner")[0]
+    db_client.update_categories([(bakery, groceries), (diner, None)])
+    assert_counter_matches(db_client, 1)
+    db_client.update_category(diner, groceries)
+    assert_counter_matches(db_client, 0)
+    db_client.update_category(bakery, "")
+    assert_counter_matches(db_client, 1)
+
+    # Soft deletes: an uncategorized row leaves the count, a categorized one doesn't touch it
+    db_client.delete_transaction(bakery)
+    assert_counter_matches(db_client, 0)
+    db_client.delete_transaction(tx_ids(db_client, "wholefds")[0])
+    assert_counter_matches(db_client, 0)
+    # Recategorizing a deleted row doesn't bring it back into the count
+    db_client.update_category(bakery, None)
+    assert_counter_matches(db_client, 0)
+
+    other = tmp_path / "chase_2024_again.csv"
+    other.write_text(CHASE_EXPORT.replace("CORNER BAKERY", "CORNER BAKERY 2"))
+    file_id = InputFile(db_client).insert_file(str(other))
+    assert_counter_matches(db_client, 1)
+
+    # Hard delete of a whole file
+    db_client.update_category(diner, None)
+    assert_counter_matches(db_client, 2)
+    db_client.delete_file_and_transactions(file_id)
+    assert_counter_matches(db_client, 1)
+
+    assert db_client.rebuild_counters() == 1
+
+
+def test_rolled_back_insert_leaves_counter_alone(db_client):
+    db_client.insert_input_file(1, 0, "2024-01-01", "chase.csv")
+    file_id = db_client.get_input_file_id(1, "chase.csv")[0]
+
+    with pytest.raises(RuntimeError):
+        with db_client.transaction():
+            db_client.insert_transactions([(-4.25, "2024-01-04", 1704326400, "CORNER BAKERY")], file_id)
+            raise RuntimeError("import failed")
+
+    assert_counter_matches(db_client, 0)
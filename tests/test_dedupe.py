@@ -0,0 +1,74 @@
+import sqlite3
+
+from data_containers.input_file import InputFile
+from database.sqlite_client import SqliteClient
+
+CHASE_EXPORT = """Transaction Date,Post Date,Description,Category,Type,Amount,Memo
+12/28/2022,12/29/2022,"AMZN Mktp US, INC",Shopping,Sale,-15.00,
+12/27/2022,12/28/2022,SOME LOCAL DINER,Food & Drink,Sale,-22.50,
+"""
+
+# The same two lines as exported later: other quoting, spacing and number format
+CHASE_EXPORT_AGAIN = """Transaction Date,Post Date,Description,Category,Type,Amount,Memo
+"12/28/2022","12/29/2022","AMZN  Mktp US,  INC","Shopping","Sale","-15.0",""
+"12/27/2022","12/28/2022","SOME LOCAL DINER ","Food & Drink","Sale","-22.5",""
+12/26/2022,12/27/2022,CORNER BAKERY,Food & Drink,Sale,-4.25,
+"""
+
+
+def make_file(db_client, source_bank_id, name):
+    db_client.insert_input_file(source_bank_id, 0, "2024-01-01", name)
+    return db_client.get_input_file_id(source_bank_id, name)[0]
+
+
+def live_memos(database_name):
+    connection = sqlite3.connect(database_name)
+    try:
+        return sorted(
+            row[0]
+            for row in connection.execute(
+                "SELECT TxMemoNormalized FROM tblTransaction WHERE DateDeleted IS NULL"
+            )
+        )
+    finally:
+        connection.close()
+
+
+def test_reimport_in_another_format_adds_only_new_lines(tmp_path):
+    database_name = str(tmp_path / "tx.db")
+    db_client = SqliteClient(database_name)
+    input_file = InputFile(db_client)
+
+    first = tmp_path / "chase_december.csv"
+    first.write_text(CHASE_EXPORT)
+    input_file.insert_file(str(first))
+    again = tmp_path / "chase_2022_full.csv"
+    again.write_text(CHASE_EXPORT_AGAIN)
+    input_file.insert_file(str(again))
+
+    assert live_memos(database_name) == ["amzn mktp us inc", "corner bakery", "some local diner"]
+
+
+def test_unique_index_drops_duplicates_the_prefilter_missed(tmp_path, monkeypatch):
+    database_name = str(tmp_path / "tx.db")
+    db_client = SqliteClient(database_name)
+    row = (-22.5, "2022-12-27", 1672099200, "SOME LOCAL DINER")
+    assert db_client.insert_transactions([row], make_file(db_client, 1, "first.csv")) == 1
+
+    # As if another writer committed the row between the lookup and the insert
+    monkeypatch.setattr(SqliteClient, "_get_existing_dedupe_keys", lambda self, connection, keys: set())
+    inserted = db_client.insert_transactions([row], make_file(db_client, 1, "second.csv"))
+
+    assert inserted == 0
+    assert live_memos(database_name) == ["some local diner"]
+
+
+def test_same_line_from_another_bank_is_kept(tmp_path):
+    database_name = str(tmp_path / "tx.db")
+    db_client = SqliteClient(database_name)
+    row = (-22.5, "2022-12-27", 1672099200, "SOME LOCAL DINER")
+
+    db_client.insert_transactions([row, row], make_file(db_client, 1, "chase.csv"))
+    db_client.insert_transactions([row], make_file(db_client, 3, "barclays.csv"))
+
+    assert live_memos(database_name) == ["some local diner", "some local diner"]
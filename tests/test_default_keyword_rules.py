@@ -0,0 +1,58 @@
+from categories.categorizer import Categorizer
+from data_containers.input_file import InputFile
+from database.sqlite_client import SqliteClient
+
+CHASE_EXPORT = """Transaction Date,Post Date,Description,Category,Type,Amount,Memo
+12/28/2022,12/29/2022,"AMZN Mktp US, INC",Shopping,Sale,-15.00,
+12/27/2022,12/28/2022,SOME LOCAL DINER,Food & Drink,Sale,-22.50,
+"""
+
+
+def test_fresh_database_import_guesses_default_keyword_category(tmp_path):
+    db_client = SqliteClient(str(tmp_path / "tx.db"))
+    # Created after tblCategoryKeywordRule, so it only gets its defaults from insert_category
+    db_client.insert_category("amazon")
+
+    export = tmp_path / "chase_2022.csv"
+    export.write_text(CHASE_EXPORT)
+    InputFile(db_client).insert_file(str(export))
+
+    memos = [tx[2] for tx in db_client.get_uncategorized_transactions()]
+    guesses = Categorizer(db_client).guess_best_categories(memos)
+    guessed = {memo: guess and guess["category_name"] for memo, guess in zip(memos, guesses)}
+
+    assert guessed == {"AMZN Mktp US, INC": "amazon", "SOME LOCAL DINER": None}
+
+
+def test_default_rules_seeded_once_per_category(tmp_path):
+    db_client = SqliteClient(str(tmp_path / "tx.db"))
+    db_client.insert_category("coffee out")
+    db_client.insert_category("coffee out")
+
+    patterns = [
+        rule["pattern"]
+        for rule in db_client.get_category_keyword_rules()
+        if rule["category_name"] == "coffee out"
+    ]
+    assert patterns == ["starbucks store", "starbucks"]
+
+
+def test_migration_backfills_defaults_for_existing_categories(tmp_path):
+    database_name = str(tmp_path / "tx.db")
+    db_client = SqliteClient(database_name)
+    # As if the category had been created before insert_category seeded defaults
+    connection = db_client.pool.checkout()
+    try:
+        connection.execute("INSERT INTO tblCategory (Name) VALUES ('gasoline')")
+        connection.execute("PRAGMA user_version = 6")
+        connection.commit()
+    finally:
+        db_client.pool.release()
+
+    db_client = SqliteClient(database_name)
+
+    assert [
+        rule["pattern"]
+        for rule in db_client.get_category_keyword_rules()
+        if rule["category_name"] == "gasoline"
+    ] == ["exxonmobil"]
@@ -0,0 +1,55 @@
+import importlib
+
+import pytest
+
+from categories.keyword_rules import KeywordRuleEngine
+
+
+def make_rule(rule_id, pattern, match_type="substring"):
+    return {
+        "rule_id": rule_id,
+        "pattern": pattern,
+        "match_type": match_type,
+        "category_id": rule_id,
+        "category_name": "category %d" % rule_id,
+        "amount_min": None,
+        "amount_max": None,
+        "source_bank_id": None,
+        "source_bank_name": None,
+        "priority": rule_id * 10,
+        "auto_apply": True,
+    }
+
+
+@pytest.mark.parametrize("pattern, match_type", [("'", "substring"), ("*", "prefix"), (" - ", "substring")])
+def test_patterns_that_clean_to_nothing_match_nothing(pattern, match_type):
+    engine = KeywordRuleEngine([make_rule(1, pattern, match_type), make_rule(2, "starbucks")])
+
+    assert engine.match_prepared(engine.prepare("SHELL OIL 12345")) is None
+    assert engine.match_prepared(engine.prepare("STARBUCKS 123"))["rule_id"] == 2
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sqlite").mkdir()
+    import server
+
+    # server opens sqlite/tx.db relative to the working directory at import
+    server = importlib.reload(server)
+    return server.app.test_client(), server.db_client
+
+
+def test_add_rule_rejects_pattern_without_letters_or_digits(client):
+    test_client, db_client = client
+    db_client.insert_category("groceries")
+    category_id = db_client.get_category_id("groceries")
+    rules_before = db_client.get_category_keyword_rules()
+
+    response = test_client.post(
+        "/moneypit/categories/matches/rules/add",
+        data={"pattern": "'", "match-type": "substring", "category-id": category_id},
+    )
+
+    assert response.status_code == 400
+    assert db_client.get_category_keyword_rules() == rules_before
@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+
+from database.sqlite_client import SqliteClient
+
+
+def make_file(db_client, name):
+    db_client.insert_input_file(1, 0, "2024-01-01", name)
+    return db_client.get_input_file_id(1, name)[0]
+
+
+def merchant_memos(database_name):
+    connection = sqlite3.connect(database_name)
+    try:
+        return dict(
+            connection.execute(
+                """
+                SELECT t.TxMemoRaw, m.MemoRaw
+                FROM tblTransaction t
+                JOIN tblMerchant m ON m.MerchantID = t.MerchantID
+                """
+            ).fetchall()
+        )
+    finally:
+        connection.close()
+
+
+def test_rolled_back_merchant_ids_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(SqliteClient, "INSERT_CHUNK_SIZE", 1)
+    database_name = str(tmp_path / "tx.db")
+    first = SqliteClient(database_name)
+    second = SqliteClient(database_name)
+
+    file_id = make_file(first, "first.csv")
+    with pytest.raises(RuntimeError):
+        with first.transaction():
+            first.insert_transactions([(-1.0, "2024-01-02", 1704153600, "FOO STORE")], file_id)
+            raise RuntimeError("import failed")
+
+    # Reuses the MerchantID the rolled-back FOO STORE row was given
+    second.insert_transactions(
+        [(-2.0, "2024-01-03", 1704240000, "BAR SHOP")], make_file(second, "second.csv")
+    )
+    first.insert_transactions([(-1.0, "2024-01-02", 1704153600, "FOO STORE")], file_id)
+
+    assert merchant_memos(database_name) == {
+        "FOO STORE": "FOO STORE",
+        "BAR SHOP": "BAR SHOP",
+    }
+
+
+def test_committed_merchant_ids_are_cached(tmp_path):
+    db_client = SqliteClient(str(tmp_path / "tx.db"))
+    db_client.insert_transactions(
+        [(-1.0, "2024-01-02", 1704153600, "FOO STORE")], make_file(db_client, "a.csv")
+    )
+
+    assert set(db_client._merchant_ids) == {"FOO STORE"}
@@ -0,0 +1,81 @@
+import sqlite3
+
+from database import migrations
+from database.sqlite_client import SqliteClient
+
+# The schema the app shipped before tblDataVersion and PRAGMA user_version existed
+LEGACY_SCHEMA = """
+CREATE TABLE tblSourceBank (
+    SourceBankID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Name TEXT,
+    UNIQUE(Name)
+);
+CREATE TABLE tblCategory (
+    CategoryID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Name TEXT,
+    UNIQUE(Name)
+);
+CREATE TABLE tblInputFile (
+    InputFileID INTEGER PRIMARY KEY AUTOINCREMENT,
+    SourceBankID INTEGER,
+    DateCreatedTimestamp INTEGER,
+    DateCreatedHuman TEXT,
+    FileName TEXT,
+    DateProcessedSuccessfullyTimestamp INTEGER NULL,
+    UNIQUE(SourceBankID, FileName)
+);
+CREATE TABLE tblTransaction (
+    TxID INTEGER PRIMARY KEY AUTOINCREMENT,
+    TxDenomination REAL,
+    TxDateHuman TEXT,
+    TxDateTimestamp INTEGER,
+    TxMemoRaw TEXT,
+    TxCustomMemo TEXT,
+    TxCategoryID INTEGER,
+    InputFileID INTEGER,
+    SourceBankID INTEGER,
+    DateDeleted TEXT,
+    UNIQUE(TxDenomination, TxDateHuman, TxDateTimestamp, TxMemoRaw, SourceBankID)
+);
+CREATE TABLE tblCategoryMatchString (
+    MatchID INTEGER PRIMARY KEY AUTOINCREMENT,
+    CategoryID INT,
+    MatchString TEXT,
+    UNIQUE(CategoryID, MatchString)
+);
+INSERT INTO tblSourceBank (Name) VALUES ('Chase');
+INSERT INTO tblCategory (Name) VALUES ('amazon');
+INSERT INTO tblInputFile (SourceBankID, DateCreatedTimestamp, DateCreatedHuman, FileName)
+VALUES (1, 0, '2022-12-30', 'chase.csv');
+INSERT INTO tblTransaction
+    (TxDenomination, TxDateHuman, TxDateTimestamp, TxMemoRaw, InputFileID, SourceBankID)
+VALUES
+    (-15.0, '12/28/2022', 1672203600, 'AMZN Mktp US, INC', 1, 1),
+    (-99.28, '12/29/2022', 1672290000, 'WHOLEFDS AVR 10371', 1, 1);
+"""
+
+
+def test_apply_brings_a_legacy_database_up_to_date(tmp_path):
+    database_name = str(tmp_path / "tx.db")
+    connection = sqlite3.connect(database_name)
+    connection.executescript(LEGACY_SCHEMA)
+    connection.close()
+
+    assert migrations.main(["migrations", "apply", database_name]) == 0
+    assert migrations.main(["migrations", "status", database_name]) == 0
+
+    connection = sqlite3.connect(database_name)
+    try:
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == SqliteClient.SCHEMA_VERSION
+        assert connection.execute(
+            """
+            SELECT COUNT(*) FROM tblTransaction
+            WHERE TxDedupeKey IS NULL OR TxMemoNormalized IS NULL OR MerchantID IS NULL
+            """
+        ).fetchone()[0] == 0
+        # The amazon category existed before the rules table did
+        assert connection.execute(
+            "SELECT COUNT(*) FROM tblCategoryKeywordRule WHERE Pattern = 'amzn mktp'"
+        ).fetchone()[0] == 1
+    finally:
+        connection.close()
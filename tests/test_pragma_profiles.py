@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from database.sqlite_client import SqliteClient
+
+# PRAGMA synchronous reads back as a number
+SYNCHRONOUS = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+
+
+@pytest.mark.parametrize("profile", sorted(SqliteClient.PRAGMA_PROFILES))
+def test_every_connection_gets_its_profile(tmp_path, profile):
+    db_client = SqliteClient(str(tmp_path / "tx.db"), pragma_profile=profile)
+    expected = dict(SqliteClient.PRAGMA_PROFILES[profile])
+
+    assert db_client.get_pragma("journal_mode").upper() == expected["journal_mode"]
+    assert db_client.get_pragma("synchronous") == SYNCHRONOUS[expected["synchronous"]]
+    assert db_client.get_pragma("busy_timeout") == expected["busy_timeout"]
+    for name in ("cache_size", "mmap_size"):
+        if name in expected:
+            assert db_client.get_pragma(name) == expected[name]
+
+
+def test_profile_comes_from_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("MONEYPIT_SQLITE_PROFILE", "legacy")
+    db_client = SqliteClient(str(tmp_path / "tx.db"))
+
+    assert db_client.pragma_profile == "legacy"
+    assert db_client.get_pragma("journal_mode") == "delete"
+
+
+def test_unknown_profile_is_refused(tmp_path):
+    with pytest.raises(ValueError):
+        SqliteClient(str(tmp_path / "tx.db"), pragma_profile="turbo")
+
+
+def test_truncate_checkpoint_empties_the_wal(tmp_path):
+    database_name = str(tmp_path / "tx.db")
+    db_client = SqliteClient(database_name)
+    db_client.insert_category("groceries")
+    assert os.path.getsize(database_name + "-wal") > 0
+
+    busy, frames, checkpointed = db_client.checkpoint_wal("truncate")
+
+    assert (busy, frames, checkpointed) == (0, 0, 0)
+    assert os.path.getsize(database_name + "-wal") == 0
+    assert db_client.get_category_id("groceries") is not None
+
+
+def test_checkpoints_are_skipped_without_a_wal(tmp_path):
+    db_client = SqliteClient(str(tmp_path / "tx.db"), pragma_profile="legacy")
+
+    assert db_client.checkpoint_wal()[1:] == (-1, -1)
+    db_client.start_wal_checkpoints(interval=3600)
+    assert db_client._checkpoint_thread is None
+
+    with pytest.raises(ValueError):
+        db_client.checkpoint_wal("sometimes")
@@ -0,0 +1,55 @@
+import pytest
+
+from database.sqlite_client import SqliteClient
+
+# Hot read query -> (table alias, index its EXPLAIN QUERY PLAN must SEARCH with)
+EXPECTED_INDEXES = {
+    "get_data_for_time_slice": ("tx", "idxTransactionLiveDate"),
+    "get_category_month_totals": ("r", "sqlite_autoindex_tblCategoryMonthTotal_1"),
+    "get_category_tx_sum_for_month": ("r", "sqlite_autoindex_tblCategoryMonthTotal_1"),
+    "get_category_6mo_avg_monthly_spend": ("r", "sqlite_autoindex_tblCategoryMonthTotal_1"),
+    "get_uncategorized_transactions": ("tx", "idxTransactionLiveCategory"),
+    "get_uncategorized_transactions_count": ("c", "sqlite_autoindex_tblCounter_1"),
+    "get_next_uncategorized_group": ("tx", "idxTransactionLiveCategoryMerchant"),
+    "get_match_strings_with_tx_counts": ("tx", "idxTransactionLiveMemoNormalized"),
+}
+
+
+@pytest.fixture(params=["empty", "analyzed"])
+def db_client(request, tmp_path):
+    db_client = SqliteClient(str(tmp_path / "tx.db"))
+    if request.param == "analyzed":
+        # Plans can change once the planner has sqlite_stat1 numbers to go on
+        db_client.insert_input_file(1, 0, "2024-01-01", "seed.csv")
+        file_id = db_client.get_input_file_id(1, "seed.csv")[0]
+        db_client.insert_transactions(
+            (
+                (-i, "2024-01-%02d" % (i % 28 + 1), 1704067200 + i * 3600, "MERCHANT %d" % (i % 50))
+                for i in range(2000)
+            ),
+            file_id,
+        )
+        db_client.insert_category("groceries")
+        category_id = db_client.get_category_id("groceries")
+        for i in range(20):
+            db_client.insert_memo_to_category("MERCHANT %d" % i, category_id)
+        connection = db_client.pool.checkout()
+        try:
+            connection.execute("ANALYZE")
+        finally:
+            db_client.pool.release()
+    return db_client
+
+
+def test_every_hot_query_is_checked():
+    assert set(SqliteClient.HOT_QUERY_INDEXES) == set(EXPECTED_INDEXES)
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED_INDEXES))
+def test_hot_query_uses_its_index(db_client, name):
+    alias, index_name = EXPECTED_INDEXES[name]
+    _, plan, _ = db_client.check_query_plans()[name]
+
+    assert any(
+        line.startswith("SEARCH %s " % alias) and index_name in line for line in plan
+    ), "\n".join(plan)
@@ -0,0 +1,133 @@
+import sqlite3
+
+import pytest
+
+from database.sqlite_client import SqliteClient
+
+# What rebuild_transaction_search() would put in the index, straight from the base tables
+EXPECTED_SQL = """
+SELECT
+    tx.TxID,
+    COALESCE(tx.TxMemoRaw, ''),
+    COALESCE(tx.TxCustomMemo, ''),
+    COALESCE(cat.Name, ''),
+    COALESCE(sb.Name, '')
+FROM tblTransaction tx
+LEFT JOIN tblCategory cat ON cat.CategoryID = tx.TxCategoryID
+LEFT JOIN tblInputFile inputFile ON inputFile.InputFileID = tx.InputFileID
+LEFT JOIN tblSourceBank sb ON sb.SourceBankID = inputFile.SourceBankID
+WHERE tx.DateDeleted IS NULL
+ORDER BY tx.TxID
+"""
+
+INDEXED_SQL = """
+SELECT rowid, TxMemoRaw, TxCustomMemo, CategoryName, SourceBankName
+FROM tblTransactionSearch
+ORDER BY rowid
+"""
+
+
+def make_file(db_client, source_bank_id, name):
+    db_client.insert_input_file(source_bank_id, 0, "2024-01-01", name)
+    return db_client.get_input_file_id(source_bank_id, name)[0]
+
+
+@pytest.fixture
+def db_client(tmp_path):
+    db_client = SqliteClient(str(tmp_path / "tx.db"))
+    db_client.insert_category("dining out")
+    db_client.insert_category("groceries")
+    db_client.insert_transactions(
+        [
+            (-22.5, "2024-01-02", 1704153600, "SOME LOCAL DINER"),
+            (-61.2, "2024-01-03", 1704240000, "WHOLEFDS AVR 10371"),
+            (-4.25, "2024-01-04", 1704326400, "CORNER BAKERY"),
+        ],
+        make_file(db_client, 1, "chase.csv"),
+    )
+    db_client.insert_transactions(
+        [(-9.99, "2024-01-05", 1704412800, "STREAMING SVC")],
+        make_file(db_client, 3, "barclays.csv"),
+    )
+    return db_client
+
+
+def assert_index_in_sync(database_name):
+    connection = sqlite3.connect(database_name)
+    try:
+        assert connection.execute(INDEXED_SQL).fetchall() == connection.execute(EXPECTED_SQL).fetchall()
+    finally:
+        connection.close()
+
+
+def tx_id(db_client, memo):
+    return db_client.search_transactions(memo)[0]["ID"]
+
+
+def searched_ids(db_client, query, category=""):
+    return sorted(row["ID"] for row in db_client.search_transactions(query, category))
+
+
+def test_index_follows_inserts_updates_and_deletes(db_client):
+    database_name = db_client.database_name
+    assert_index_in_sync(database_name)
+
+    diner = tx_id(db_client, "diner")
+    bakery = tx_id(db_client, "bakery")
+    wholefds = tx_id(db_client, "wholefds")
+
+    db_client.update_categories(
+        [(diner, db_client.get_category_id("dining out")), (wholefds, db_client.get_category_id("groceries"))]
+    )
+    db_client.update_custom_memo(bakery, "Birthday cake")
+    assert_index_in_sync(database_name)
+    assert searched_ids(db_client, "birthday") == [bakery]
+    assert searched_ids(db_client, "", "groceries") == [wholefds]
+
+    db_client.update_custom_memo(bakery, "")
+    db_client.update_category(diner, None)
+    assert_index_in_sync(database_name)
+    assert searched_ids(db_client, "birthday") == []
+
+    db_client.delete_transaction(wholefds)
+    assert_index_in_sync(database_name)
+    assert searched_ids(db_client, "wholefds") == []
+
+    db_client.delete_file_and_transactions(db_client.get_input_file_id(3, "barclays.csv")[0])
+    assert_index_in_sync(database_name)
+    assert searched_ids(db_client, "streaming") == []
+
+
+def test_index_follows_category_and_bank_renames(db_client):
+    database_name = db_client.database_name
+    diner = tx_id(db_client, "diner")
+    db_client.update_category(diner, db_client.get_category_id("dining out"))
+
+    connection = sqlite3.connect(database_name)
+    try:
+        connection.execute("UPDATE tblCategory SET Name = 'restaurants' WHERE Name = 'dining out'")
+        connection.execute("UPDATE tblSourceBank SET Name = 'Chase Sapphire' WHERE SourceBankID = 1")
+        connection.commit()
+    finally:
+        connection.close()
+
+    assert_index_in_sync(database_name)
+    # Renamed values are what a memo search filters on and returns
+    assert searched_ids(db_client, "diner", "restaurants") == [diner]
+    assert searched_ids(db_client, "diner", "dining out") == []
+    assert db_client.search_transactions("bakery")[0]["SourceBankName"] == "Chase Sapphire"
+
+
+def test_rebuild_matches_the_trigger_maintained_index(db_client):
+    database_name = db_client.database_name
+    db_client.update_custom_memo(tx_id(db_client, "bakery"), "Birthday cake")
+    db_client.delete_transaction(tx_id(db_client, "diner"))
+
+    connection = sqlite3.connect(database_name)
+    try:
+        before = connection.execute(INDEXED_SQL).fetchall()
+    finally:
+        connection.close()
+
+    assert db_client.rebuild_transaction_search() == len(before)
+    assert_index_in_sync(database_name)
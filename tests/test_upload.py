@@ -0,0 +1,42 @@
+import importlib
+import io
+import threading
+
+import pytest
+
+CHASE_EXPORT = b"""Transaction Date,Post Date,Description,Category,Type,Amount,Memo
+12/27/2022,12/28/2022,SOME LOCAL DINER,Food & Drink,Sale,-22.50,
+"""
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sqlite").mkdir()
+    import server
+
+    # server opens sqlite/tx.db relative to the working directory at import
+    server = importlib.reload(server)
+    server.app.config["WTF_CSRF_ENABLED"] = False
+    return server.app.test_client(), server.db_client
+
+
+def test_upload_that_outwaits_the_writer_is_not_an_error(client, tmp_path):
+    test_client, db_client = client
+    db_client.write_timeout = 0.1
+    release = threading.Event()
+    blocker = db_client.writer.submit(release.wait, 5)
+
+    try:
+        response = test_client.post(
+            "/moneypit/transaction/upload",
+            data={"file": (io.BytesIO(CHASE_EXPORT), "chase_%s.csv" % tmp_path.name)},
+            content_type="multipart/form-data",
+        )
+    finally:
+        release.set()
+        blocker.result(timeout=5)
+
+    assert response.status_code == 302
+    with test_client.session_transaction() as session:
+        assert session["_flashes"][0][0] == "info"
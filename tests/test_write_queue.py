@@ -0,0 +1,59 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+from database.connection_pool import ConnectionPool
+from database.sqlite_client import SqliteClient
+from database.write_queue import WriteQueue, WriterStoppedError
+
+
+def make_writer(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "tx.db"))
+    return WriteQueue(pool, str(tmp_path / "tx.db.write.lock"))
+
+
+def test_failing_job_does_not_fail_its_batch(tmp_path):
+    writer = make_writer(tmp_path)
+    ok = writer.submit(lambda: 1)
+    failing = writer.submit(lambda: 1 / 0)
+
+    assert ok.result(timeout=5) == 1
+    assert isinstance(failing.exception(timeout=5), ZeroDivisionError)
+
+
+# The interrupt is re-raised on the writer thread, which pytest reports
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_interrupt_stops_writer_and_fails_pending_jobs(tmp_path):
+    writer = make_writer(tmp_path)
+    started = threading.Event()
+    release = threading.Event()
+
+    def interrupted():
+        started.set()
+        release.wait(5)
+        raise KeyboardInterrupt
+
+    running = writer.submit(interrupted)
+    started.wait(5)
+    queued = writer.submit(lambda: 1)
+    release.set()
+    writer._thread.join(5)
+
+    assert isinstance(running.exception(timeout=5), WriterStoppedError)
+    assert isinstance(queued.exception(timeout=5), WriterStoppedError)
+    assert isinstance(writer.submit(lambda: 1).exception(timeout=5), WriterStoppedError)
+
+
+def test_run_serialized_times_out(tmp_path):
+    db_client = SqliteClient(str(tmp_path / "tx.db"))
+    db_client.start_writer()
+    db_client.write_timeout = 0.1
+    release = threading.Event()
+    blocker = db_client.writer.submit(release.wait, 5)
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        db_client.run_serialized(lambda: 1)
+
+    release.set()
+    assert blocker.result(timeout=5) is True
@@ -0,0 +1,39 @@
+import hashlib
+import re
+
+
+_NON_ALNUM = re.compile(r"[^a-zA-Z\d\s:]")
+_WHITESPACE_RUN = re.compile(r"\s+")
+
+
+def clean_memo(memo):
+    # Apostrophes are dropped rather than spaced out: memos used to be stored with them
+    # stripped, and "MCDONALD'S" has to keep matching (and deduping against) "MCDONALDS"
+    memo = memo.replace("'", "")
+    # Get rid of any characters that aren't alphanumeric or spaces
+    memo = _NON_ALNUM.sub(" ", memo)
+    # One more cleanup to get rid of multiple spaces in a row
+    memo = _WHITESPACE_RUN.sub(" ", memo)
+
+    # Lowercase to keep everything consistent
+    return memo.lower()
+
+
+def normalize_memo(memo):
+    """clean_memo without the leading/trailing space; the form stored in the *Normalized columns."""
+    return clean_memo(memo).strip()
+
+
+def get_dedupe_key(denomination, date_human, memo_raw, source_bank_id):
+    """Hash identifying one bank line regardless of which export file it came from.
+
+    The memo is normalized with clean_memo so punctuation and spacing differences
+    between exports (quoted vs. unquoted fields, doubled spaces) collapse together.
+    """
+    raw = "%.2f|%s|%s|%s" % (
+        float(denomination),
+        date_human,
+        normalize_memo(memo_raw),
+        source_bank_id,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()